@@ -11,4 +11,87 @@ if not BOT_TOKEN:
 # Указываем путь относительно корня проекта
 PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))  # IvestFreedomBot/
 DATABASE_PATH = os.path.join(PROJECT_ROOT, os.getenv("DB_PATH", "data/database/finance.db"))
-ADMINS_FILE = os.path.join(PROJECT_ROOT, os.getenv("ADMINS_FILE", "data/admins.txt"))
\ No newline at end of file
+ADMINS_FILE = os.path.join(PROJECT_ROOT, os.getenv("ADMINS_FILE", "data/admins.txt"))
+LOG_DIR = os.path.join(PROJECT_ROOT, os.getenv("LOG_DIR", "data/logs"))
+
+# Профиль SQLite: применяется к каждому новому соединению
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")  # WAL — читатели не блокируют писателя
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # в режиме WAL NORMAL безопасен и быстрее FULL
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))  # ожидание блокировки вместо "database is locked"
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))  # кэш страниц на соединение, КиБ
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))  # байт, 0 — отключить mmap
+DB_TEMP_STORE = os.getenv("DB_TEMP_STORE", "MEMORY")  # DEFAULT | FILE | MEMORY
+
+# Пул соединений
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "5"))  # соединения только для чтения (параллельные выборки экспорта)
+
+# Кэш telegram_id → пользователь
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))  # секунд
+
+# Экспорт в Excel: сборка файла вне event loop
+EXPORT_BACKEND = os.getenv("EXPORT_BACKEND", "streaming")  # streaming (openpyxl write-only) | pandas
+EXPORT_EXECUTOR = os.getenv("EXPORT_EXECUTOR", "process")  # process | thread
+EXPORT_MAX_WORKERS = int(os.getenv("EXPORT_MAX_WORKERS", "2"))
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "2"))  # одновременных сборок, остальные ждут
+
+# Кэш готовых отчётов
+EXPORT_CACHE_DIR = os.path.join(PROJECT_ROOT, os.getenv("EXPORT_CACHE_DIR", "data/exports"))
+EXPORT_CACHE_MAX_BYTES = int(float(os.getenv("EXPORT_CACHE_MAX_MB", "200")) * 1024 * 1024)
+EXPORT_CACHE_MAX_ENTRIES = int(os.getenv("EXPORT_CACHE_MAX_ENTRIES", "500"))
+
+# Рассылка напоминаний: лимит Telegram ~30 сообщений/с на бота
+REMINDER_RATE = float(os.getenv("REMINDER_RATE", "25"))  # сообщений в секунду
+REMINDER_BURST = int(os.getenv("REMINDER_BURST", "25"))  # допустимый всплеск
+REMINDER_CONCURRENCY = int(os.getenv("REMINDER_CONCURRENCY", "10"))  # одновременных запросов к API
+REMINDER_MAX_RETRIES = int(os.getenv("REMINDER_MAX_RETRIES", "3"))  # повторов при временных ошибках
+REMINDER_MAX_THROTTLES = int(os.getenv("REMINDER_MAX_THROTTLES", "3"))  # повторов одного сообщения после RetryAfter
+REMINDER_HOUR = int(os.getenv("REMINDER_HOUR", "9"))  # час ежедневной рассылки (MSK)
+REMINDER_LEDGER_BATCH = int(os.getenv("REMINDER_LEDGER_BATCH", "100"))  # записей журнала за одну транзакцию
+# За сколько дней до срока напоминать (0 — в день срока); о просрочке — каждый день
+REMINDER_OFFSETS = sorted({int(d) for d in os.getenv("REMINDER_OFFSETS", "7,3,1,0").split(",") if d.strip()})
+if not REMINDER_OFFSETS or REMINDER_OFFSETS[0] < 0:
+    raise ValueError("REMINDER_OFFSETS: нужен непустой список неотрицательных чисел дней, например 7,3,1,0")
+REMINDER_OVERDUE_DAYS = int(os.getenv("REMINDER_OVERDUE_DAYS", "30"))  # напоминать о просрочке не дольше N дней
+
+# Планировщик: задачи хранятся в отдельном файле SQLite рядом с основной БД
+SCHEDULER_DB_PATH = os.path.join(PROJECT_ROOT, os.getenv("SCHEDULER_DB_PATH", "data/database/scheduler.db"))
+SCHEDULER_MISFIRE_GRACE = int(os.getenv("SCHEDULER_MISFIRE_GRACE", str(6 * 3600)))  # секунд: пропуск дольше — не догоняем
+# Лидер среди процессов бота: только он выполняет задачи планировщика
+SCHEDULER_LEASE_TTL = float(os.getenv("SCHEDULER_LEASE_TTL", "15"))  # секунд: через столько лидерство перейдёт к другому
+SCHEDULER_LEASE_RENEW = float(os.getenv("SCHEDULER_LEASE_RENEW", "5"))  # как часто продлевать аренду
+
+# Получение апдейтов: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling | webhook
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")  # публичный https-адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # пусто — сгенерируется при запуске
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+HANDLER_CONCURRENCY = int(os.getenv("HANDLER_CONCURRENCY", "64"))  # апдейтов в обработке одновременно
+
+# Хранилище состояний FSM
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")  # sqlite | memory
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))  # записей в памяти (LRU)
+FSM_TTL = float(os.getenv("FSM_TTL", str(7 * 24 * 3600)))  # секунд: брошенные диалоги забываются
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.5"))  # секунд между записями в БД
+FSM_FLUSH_BATCH = int(os.getenv("FSM_FLUSH_BATCH", "200"))  # записать сразу, если накопилось столько изменений
+
+# Несколько процессов-обработчиков (python -m bot.supervisor)
+WORKERS = int(os.getenv("WORKERS", "2"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))  # апдейтов в очереди процесса; дальше — ждём
+WORKER_SHUTDOWN_TIMEOUT = float(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "30"))  # секунд на завершение начатых апдейтов
+
+# Ограничение частоты апдейтов (rate — в секунду, burst — запас подряд)
+THROTTLE_CHAT_RATE = float(os.getenv("THROTTLE_CHAT_RATE", "2"))
+THROTTLE_CHAT_BURST = float(os.getenv("THROTTLE_CHAT_BURST", "6"))
+THROTTLE_GLOBAL_RATE = float(os.getenv("THROTTLE_GLOBAL_RATE", "100"))  # на всего бота: делится между WORKERS процессами
+THROTTLE_GLOBAL_BURST = float(os.getenv("THROTTLE_GLOBAL_BURST", "200"))
+THROTTLE_EXPENSIVE_RATE = float(os.getenv("THROTTLE_EXPENSIVE_RATE", "0.05"))  # экспорт и статистика: раз в 20 секунд
+THROTTLE_EXPENSIVE_BURST = float(os.getenv("THROTTLE_EXPENSIVE_BURST", "2"))
+THROTTLE_CHATS = int(os.getenv("THROTTLE_CHATS", "10000"))  # чатов со своими лимитами в памяти
+THROTTLE_NOTICE_INTERVAL = float(os.getenv("THROTTLE_NOTICE_INTERVAL", "10"))  # секунд между предупреждениями чату
+SHED_QUEUE_DEPTH = int(os.getenv("SHED_QUEUE_DEPTH", "64"))  # апдейтов в очереди, после которых отчёты откладываются
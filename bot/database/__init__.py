@@ -1,9 +1,11 @@
 # bot/database/__init__.py
-from sqlalchemy.ext.asyncio import async_engine_from_config
 from .models import Base
 from .session import engine
+from .migrations import run_migrations
+from . import data_version  # регистрирует обработчик версий данных
 
 async def create_db_and_tables():
+    """Приводит схему БД к актуальной версии (см. bot/database/migrations.py)."""
     async with engine.begin() as conn:
-        # Создаём таблицы, если их нет
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        # Если версия совпадает — это один SELECT, миграции не выполняются
+        await conn.run_sync(run_migrations)
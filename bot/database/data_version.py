@@ -0,0 +1,45 @@
+# bot/database/data_version.py
+"""
+Версия данных пользователя.
+
+При каждом flush, затрагивающем транзакции, долги, счета, платежи по долгам или
+графики платежей, users.data_version владельца увеличивается в той же транзакции БД.
+По версии можно понять, что готовый отчёт устарел, не перечитывая сами данные.
+"""
+from sqlalchemy import event, select, update, or_
+from sqlalchemy.orm import Session
+
+from bot.database.models import User, Transaction, Debt, Bill, DebtPayment, PaymentSchedule
+
+USER_OWNED = (Transaction, Debt, Bill)
+DEBT_OWNED = (DebtPayment, PaymentSchedule)
+
+
+def _changed_objects(session: Session):
+    yield from session.new
+    yield from session.deleted
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            yield obj
+
+
+@event.listens_for(Session, "after_flush")
+def bump_data_versions(session: Session, flush_context):
+    user_ids, debt_ids = set(), set()
+    for obj in _changed_objects(session):
+        if isinstance(obj, USER_OWNED) and obj.user_id is not None:
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, DEBT_OWNED) and obj.debt_id is not None:
+            debt_ids.add(obj.debt_id)
+
+    if not user_ids and not debt_ids:
+        return
+
+    owners = User.id.in_(user_ids)
+    if debt_ids:
+        owners = or_(owners, User.id.in_(select(Debt.user_id).where(Debt.id.in_(debt_ids))))
+
+    # session.connection(): внутри flush нельзя вызывать session.execute (он снова запустит autoflush)
+    session.connection().execute(
+        update(User).where(owners).values(data_version=User.data_version + 1)
+    )
@@ -0,0 +1,200 @@
+# bot/database/fsm_storage.py
+import asyncio
+import pickle
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from bot.config import FSM_CACHE_SIZE, FSM_TTL, FSM_FLUSH_INTERVAL, FSM_FLUSH_BATCH
+from bot.database.repository import FsmStateRepository
+from bot.database.session import async_session
+from bot.logger import logger
+
+# Раз в столько секунд из БД удаляются просроченные записи
+PURGE_INTERVAL = 600
+
+
+class _Record:
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[dict] = None, updated_at: float = 0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM в SQLite с кэшем в памяти.
+
+    Чтение идёт из LRU-кэша, промах — один SELECT по ключу. Запись сразу попадает
+    в кэш (следующий апдейт видит её без БД), а в базу изменения уходят пачкой
+    фоновой задачей раз в FSM_FLUSH_INTERVAL или при накоплении FSM_FLUSH_BATCH.
+    Ещё не записанные изменения не вытесняются из памяти. Записи, которые не
+    менялись дольше FSM_TTL, считаются пустыми и периодически удаляются.
+
+    Кэш не сбрасывается при изменениях из других процессов, поэтому при нескольких
+    процессах каждый чат должен всегда попадать в один и тот же процесс.
+    """
+
+    def __init__(
+        self,
+        session_factory=async_session,
+        cache_size: int = FSM_CACHE_SIZE,
+        ttl: float = FSM_TTL,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        flush_batch: int = FSM_FLUSH_BATCH,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.session_factory = session_factory
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._clock = clock
+        self._cache: "OrderedDict[str, _Record]" = OrderedDict()
+        self._dirty: Dict[str, _Record] = {}
+        # Изменения, которые сейчас записываются в БД: до коммита строка в БД ещё старая
+        self._inflight: Dict[str, _Record] = {}
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(str(part) if part is not None else "" for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+        ))
+
+    def _expired(self, record: _Record) -> bool:
+        return record.updated_at < self._clock() - self.ttl
+
+    async def _load(self, key: str) -> _Record:
+        record = self._dirty.get(key) or self._inflight.get(key) or self._cache.get(key)
+        if record is not None:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+            if self._expired(record):
+                record = _Record(updated_at=self._clock())
+                self._remember(key, record)
+            return record
+
+        async with self.session_factory() as session:
+            row = await FsmStateRepository(session).get(key, self._clock() - self.ttl)
+        if row is None:
+            record = _Record(updated_at=self._clock())
+        else:
+            state, data = row
+            record = _Record(state, pickle.loads(data) if data else {}, self._clock())
+        self._remember(key, record)
+        return record
+
+    def _remember(self, key: str, record: _Record):
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            # Незаписанные изменения остаются в _dirty до ближайшей записи в БД
+            self._cache.popitem(last=False)
+
+    def _mark_dirty(self, key: str, record: _Record):
+        record.updated_at = self._clock()
+        self._remember(key, record)
+        self._dirty[key] = record
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(self._dirty) >= self.flush_batch:
+            self._flush_requested.set()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        skey = self._key(key)
+        record = await self._load(skey)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(skey, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self._key(key))).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        skey = self._key(key)
+        record = await self._load(skey)
+        record.data = data.copy()
+        self._mark_dirty(skey, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._load(self._key(key))).data.copy()
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией."""
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self):
+        batch, self._dirty = self._dirty, {}
+        if not batch:
+            return
+        self._inflight.update(batch)
+
+        rows, deleted = [], []
+        for key, record in batch.items():
+            if record.is_empty():
+                deleted.append(key)
+            else:
+                rows.append({
+                    "key": key,
+                    "state": record.state,
+                    "data": pickle.dumps(record.data, pickle.HIGHEST_PROTOCOL) if record.data else None,
+                    "updated_at": record.updated_at,
+                })
+        try:
+            async with self.session_factory() as session:
+                repo = FsmStateRepository(session)
+                await repo.save_many(rows)
+                await repo.delete_many(deleted)
+                await session.commit()
+        except BaseException:
+            # Вернём изменения в очередь (в том числе при отмене посреди записи), если их ещё не перезаписали более новые
+            for key, record in batch.items():
+                self._dirty.setdefault(key, record)
+            raise
+        finally:
+            for key, record in batch.items():
+                if self._inflight.get(key) is record:
+                    del self._inflight[key]
+
+    async def purge_expired(self) -> int:
+        async with self.session_factory() as session:
+            removed = await FsmStateRepository(session).delete_expired(self._clock() - self.ttl)
+            await session.commit()
+        return removed
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+                if self._clock() - self._last_purge >= PURGE_INTERVAL:
+                    self._last_purge = self._clock()
+                    await self.purge_expired()
+            except Exception as e:
+                logger.error(f"Не удалось сохранить состояния FSM: {e}")
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
@@ -0,0 +1,41 @@
+# bot/database/maintenance.py
+"""
+Служебные команды для БД.
+
+    python -m bot.database.maintenance migrate
+    python -m bot.database.maintenance rebuild-rollups [--user-id ID]
+"""
+import argparse
+import asyncio
+
+from bot.database import create_db_and_tables
+from bot.database.repository import MonthlyRollupRepository
+from bot.database.session import engine, session_scope
+
+
+async def rebuild_rollups(user_id: int = None):
+    async with session_scope() as session:
+        await MonthlyRollupRepository(session).rebuild(user_id)
+
+
+async def _run(args):
+    try:
+        await create_db_and_tables()
+        if args.command == "rebuild-rollups":
+            await rebuild_rollups(args.user_id)
+            print("Помесячные итоги пересчитаны.")
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bot.database.maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="применить миграции схемы")
+    rebuild = subparsers.add_parser("rebuild-rollups", help="пересчитать помесячные итоги из транзакций")
+    rebuild.add_argument("--user-id", type=int, default=None, help="только для одного пользователя (users.id)")
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# bot/database/migrations.py
+"""
+Версионные миграции схемы БД.
+
+Каждая миграция — функция, принимающая синхронное соединение (вызывается через
+``conn.run_sync``). Номер последней применённой миграции хранится в таблице
+``schema_version``; при старте применяются только недостающие миграции.
+
+DDL в миграциях записан как есть, а не берётся из моделей: миграция N должна
+создавать ту схему, что была на момент N, как бы модели ни менялись потом.
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, select, func, inspect
+from sqlalchemy.engine import Connection
+
+from bot.logger import logger
+
+schema_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _execute_all(conn: Connection, statements: list[str]):
+    for statement in statements:
+        conn.exec_driver_sql(statement)
+
+
+def _m001_initial_tables(conn: Connection):
+    """Исходные таблицы (раньше создавались create_all при каждом запуске)."""
+    _execute_all(conn, [
+        """CREATE TABLE IF NOT EXISTS users (
+            id INTEGER NOT NULL,
+            telegram_id INTEGER NOT NULL,
+            username VARCHAR,
+            full_name VARCHAR,
+            created_at DATETIME NOT NULL,
+            is_active BOOLEAN NOT NULL,
+            PRIMARY KEY (id)
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_telegram_id ON users (telegram_id)",
+        "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+        """CREATE TABLE IF NOT EXISTS debts (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            description VARCHAR NOT NULL,
+            total_amount NUMERIC(10, 2) NOT NULL,
+            remaining_amount NUMERIC(10, 2) NOT NULL,
+            due_date DATE NOT NULL,
+            category VARCHAR NOT NULL,
+            note VARCHAR,
+            created_at DATETIME NOT NULL,
+            is_active BOOLEAN NOT NULL,
+            is_schedule_created BOOLEAN NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_debts_id ON debts (id)",
+        """CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            type VARCHAR NOT NULL,
+            amount NUMERIC(10, 2) NOT NULL,
+            description VARCHAR,
+            date DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_id ON transactions (id)",
+        """CREATE TABLE IF NOT EXISTS bills (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            telegram_id INTEGER NOT NULL,
+            description VARCHAR NOT NULL,
+            amount NUMERIC(10, 2) NOT NULL,
+            due_date DATE NOT NULL,
+            is_paid BOOLEAN NOT NULL,
+            paid_at DATETIME,
+            debt_id INTEGER,
+            created_at DATETIME NOT NULL,
+            is_recurring BOOLEAN NOT NULL,
+            total_installments INTEGER,
+            current_installment INTEGER NOT NULL,
+            recurrence_type VARCHAR NOT NULL,
+            recurrence_value INTEGER NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id),
+            FOREIGN KEY(debt_id) REFERENCES debts (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_bills_id ON bills (id)",
+        """CREATE TABLE IF NOT EXISTS debt_payments (
+            id INTEGER NOT NULL,
+            debt_id INTEGER NOT NULL,
+            amount NUMERIC(10, 2) NOT NULL,
+            paid_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(debt_id) REFERENCES debts (id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS payment_schedules (
+            id INTEGER NOT NULL,
+            debt_id INTEGER NOT NULL,
+            bill_id INTEGER,
+            amount NUMERIC(10, 2) NOT NULL,
+            due_date DATE NOT NULL,
+            is_paid BOOLEAN NOT NULL,
+            paid_at DATETIME,
+            created_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(debt_id) REFERENCES debts (id),
+            FOREIGN KEY(bill_id) REFERENCES bills (id)
+        )""",
+    ])
+
+
+def _m002_hot_query_indexes(conn: Connection):
+    """Индексы по внешним ключам и датам, по которым фильтруют репозитории."""
+    _execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_transactions_user_id_date ON transactions (user_id, date)",
+        "CREATE INDEX IF NOT EXISTS ix_bills_user_id_due_date ON bills (user_id, due_date)",
+        "CREATE INDEX IF NOT EXISTS ix_bills_due_date ON bills (due_date)",
+        "CREATE INDEX IF NOT EXISTS ix_debts_user_id ON debts (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_debt_payments_debt_id ON debt_payments (debt_id)",
+        "CREATE INDEX IF NOT EXISTS ix_payment_schedules_debt_id ON payment_schedules (debt_id)",
+    ])
+
+
+def _m003_composite_indexes(conn: Connection):
+    """Составные индексы; заменяют более узкие индексы миграции 2."""
+    superseded = [
+        "ix_transactions_user_id_date",
+        "ix_bills_user_id_due_date",
+        "ix_debts_user_id",
+        "ix_debt_payments_debt_id",
+        "ix_payment_schedules_debt_id",
+    ]
+    _execute_all(conn, [f"DROP INDEX IF EXISTS {name}" for name in superseded])
+    _execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_transactions_user_date_type ON transactions (user_id, date, type)",
+        "CREATE INDEX IF NOT EXISTS ix_debts_user_active_due ON debts (user_id, is_active, due_date)",
+        "CREATE INDEX IF NOT EXISTS ix_bills_user_paid_due ON bills (user_id, is_paid, due_date)",
+        "CREATE INDEX IF NOT EXISTS ix_debt_payments_debt_paid_at ON debt_payments (debt_id, paid_at)",
+        "CREATE INDEX IF NOT EXISTS ix_payment_schedules_debt_paid_due ON payment_schedules (debt_id, is_paid, due_date)",
+    ])
+
+
+def _m004_monthly_rollups(conn: Connection):
+    """Таблица помесячных итогов, заполненная по существующим транзакциям."""
+    _execute_all(conn, [
+        """CREATE TABLE IF NOT EXISTS monthly_rollups (
+            user_id INTEGER NOT NULL,
+            month DATE NOT NULL,
+            type VARCHAR NOT NULL,
+            total NUMERIC(12, 2) NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, month, type),
+            FOREIGN KEY(user_id) REFERENCES users (id)
+        )""",
+        "DELETE FROM monthly_rollups",
+        """INSERT INTO monthly_rollups (user_id, month, type, total, count)
+        SELECT user_id, date(date, 'start of month'), type, sum(amount), count(id)
+        FROM transactions
+        GROUP BY user_id, date(date, 'start of month'), type""",
+    ])
+
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def _m005_user_data_version(conn: Connection):
+    """Счётчик версии данных пользователя (ключ кэша экспорта)."""
+    if not _has_column(conn, "users", "data_version"):
+        conn.exec_driver_sql("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+
+
+def _m006_sent_files(conn: Connection):
+    """file_id отправленных документов по хэшу содержимого."""
+    conn.exec_driver_sql(
+        """CREATE TABLE IF NOT EXISTS sent_files (
+            content_hash VARCHAR(64) NOT NULL,
+            file_id VARCHAR NOT NULL,
+            created_at DATETIME NOT NULL,
+            PRIMARY KEY (content_hash)
+        )"""
+    )
+
+
+def _m007_reminder_log(conn: Connection):
+    """Журнал отправленных напоминаний."""
+    conn.exec_driver_sql(
+        """CREATE TABLE IF NOT EXISTS reminder_log (
+            id INTEGER NOT NULL,
+            item_type VARCHAR NOT NULL,
+            item_id INTEGER NOT NULL,
+            kind VARCHAR NOT NULL,
+            reminder_date DATE NOT NULL,
+            sent_at DATETIME NOT NULL,
+            PRIMARY KEY (id),
+            CONSTRAINT uq_reminder_log_item_kind_date UNIQUE (item_type, item_id, kind, reminder_date)
+        )"""
+    )
+
+
+def _m008_digest_indexes(conn: Connection):
+    """Индексы для ежедневной сводки по сроку (без привязки к пользователю)."""
+    _execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_debts_active_due ON debts (is_active, due_date)",
+        "CREATE INDEX IF NOT EXISTS ix_payment_schedules_paid_due ON payment_schedules (is_paid, due_date)",
+    ])
+
+
+def _m009_reminder_offsets(conn: Connection):
+    """Напоминание "за день" теперь один из порогов: due_tomorrow → d1."""
+    conn.exec_driver_sql("UPDATE reminder_log SET kind = 'd1' WHERE kind = 'due_tomorrow'")
+
+
+def _m010_leases(conn: Connection):
+    """Аренды для выбора лидера планировщика."""
+    conn.exec_driver_sql(
+        """CREATE TABLE IF NOT EXISTS leases (
+            name VARCHAR NOT NULL,
+            holder VARCHAR NOT NULL,
+            expires_at FLOAT NOT NULL,
+            PRIMARY KEY (name)
+        )"""
+    )
+
+
+def _m011_fsm_states(conn: Connection):
+    """Хранилище состояний FSM."""
+    _execute_all(conn, [
+        """CREATE TABLE IF NOT EXISTS fsm_states (
+            "key" VARCHAR NOT NULL,
+            state VARCHAR,
+            data BLOB,
+            updated_at FLOAT NOT NULL,
+            PRIMARY KEY ("key")
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_fsm_states_updated_at ON fsm_states (updated_at)",
+    ])
+
+
+# Порядок важен: номера только растут, применённые миграции не редактируются
+MIGRATIONS = [
+    (1, "Исходные таблицы", _m001_initial_tables),
+    (2, "Индексы для горячих запросов", _m002_hot_query_indexes),
+    (3, "Составные индексы из моделей", _m003_composite_indexes),
+    (4, "Помесячные итоги транзакций", _m004_monthly_rollups),
+    (5, "Версия данных пользователя", _m005_user_data_version),
+    (6, "file_id отправленных файлов", _m006_sent_files),
+    (7, "Журнал напоминаний", _m007_reminder_log),
+    (8, "Индексы ежедневной сводки", _m008_digest_indexes),
+    (9, "Пороги напоминаний", _m009_reminder_offsets),
+    (10, "Аренды лидера", _m010_leases),
+    (11, "Состояния FSM", _m011_fsm_states),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: Connection) -> int:
+    schema_version.create(conn, checkfirst=True)
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def _is_up_to_date(conn: Connection) -> bool:
+    # Обычный запуск без блокировки: схема уже актуальна, хватает одного SELECT
+    if not inspect(conn).has_table(schema_version.name):
+        return False
+    return (conn.execute(select(func.max(schema_version.c.version))).scalar() or 0) >= LATEST_VERSION
+
+
+def run_migrations(conn: Connection) -> list[int]:
+    """
+    Применяет недостающие миграции. Возвращает номера применённых.
+
+    Процессов бота может быть несколько, и стартуют они одновременно. Поэтому
+    перед миграциями берём блокировку записи (BEGIN IMMEDIATE) и перечитываем
+    версию уже под ней: второй процесс дождётся первого и ничего не применит.
+    """
+    if _is_up_to_date(conn):
+        return []
+    if not conn.connection.driver_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    current = get_schema_version(conn)
+    if current >= LATEST_VERSION:
+        return []
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info(f"Применяем миграцию {version}: {description}")
+        migrate(conn)
+        conn.execute(
+            schema_version.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.now(),
+            )
+        )
+        applied.append(version)
+    return applied
@@ -1,6 +1,7 @@
 # bot/database/models.py
-from datetime import datetime
-from sqlalchemy import Integer, String, DateTime, Numeric, Boolean, ForeignKey, Date
+from datetime import datetime, date
+from sqlalchemy import Integer, String, DateTime, Numeric, Boolean, ForeignKey, Date, Index, UniqueConstraint, Float
+from sqlalchemy import LargeBinary
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
@@ -24,9 +25,15 @@ class User(Base):
         default=lambda: datetime.now(MSK)
     )
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Счётчик изменений данных пользователя (см. bot/database/data_version.py)
+    data_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # TransactionRepository.get_transactions_by_user_and_period
+        Index("ix_transactions_user_date_type", "user_id", "date", "type"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
@@ -40,6 +47,12 @@ class Transaction(Base):
 
 class Debt(Base):
     __tablename__ = "debts"
+    __table_args__ = (
+        # DebtRepository.get_active_debts_by_user / get_debts_with_status
+        Index("ix_debts_user_active_due", "user_id", "is_active", "due_date"),
+        # ежедневная сводка: просроченные долги всех пользователей
+        Index("ix_debts_active_due", "is_active", "due_date"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
@@ -55,6 +68,12 @@ class Debt(Base):
 
 class Bill(Base):
     __tablename__ = "bills"
+    __table_args__ = (
+        # BillRepository.get_active_bills_by_user
+        Index("ix_bills_user_paid_due", "user_id", "is_paid", "due_date"),
+        # напоминания планировщика по сроку оплаты
+        Index("ix_bills_due_date", "due_date"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
@@ -72,9 +91,23 @@ class Bill(Base):
     recurrence_type: Mapped[str] = mapped_column(String, default="months")  # "weeks" или "months"
     recurrence_value: Mapped[int] = mapped_column(Integer, default=1)  # 1, 2, 3...
 
+# Помесячные итоги доходов/расходов: обновляются вместе с добавлением транзакции
+class MonthlyRollup(Base):
+    __tablename__ = "monthly_rollups"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    month: Mapped[date] = mapped_column(Date, primary_key=True)  # первое число месяца
+    type: Mapped[str] = mapped_column(String, primary_key=True)  # 'income' или 'expense'
+    total: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False, default=0)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
 # модель создания страницы при выгрузке в ексель с историей оплат
 class DebtPayment(Base):
     __tablename__ = "debt_payments"
+    __table_args__ = (
+        # DebtPaymentRepository.get_payments_by_debt / get_payments_by_user
+        Index("ix_debt_payments_debt_paid_at", "debt_id", "paid_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     debt_id: Mapped[int] = mapped_column(Integer, ForeignKey("debts.id"))
@@ -83,6 +116,12 @@ class DebtPayment(Base):
 
 class PaymentSchedule(Base):
     __tablename__ = "payment_schedules"
+    __table_args__ = (
+        # PaymentScheduleRepository.get_unpaid_schedules_by_debt
+        Index("ix_payment_schedules_debt_paid_due", "debt_id", "is_paid", "due_date"),
+        # ежедневная сводка: ближайшие платежи всех пользователей
+        Index("ix_payment_schedules_paid_due", "is_paid", "due_date"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     debt_id: Mapped[int] = mapped_column(Integer, ForeignKey("debts.id"))
@@ -91,4 +130,50 @@ class PaymentSchedule(Base):
     due_date: Mapped[datetime] = mapped_column(Date)
     is_paid: Mapped[bool] = mapped_column(Boolean, default=False)
     paid_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now(MSK))
\ No newline at end of file
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now(MSK))
+
+# file_id, который Telegram вернул при отправке файла: повторная отправка того же содержимого — без загрузки
+class SentFile(Base):
+    __tablename__ = "sent_files"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # ключ отчёта (ExportFile.key), не хэш содержимого
+    file_id: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(MSK))
+
+
+# Журнал отправленных напоминаний: одно напоминание каждого вида на объект и дату — ровно один раз
+class ReminderLog(Base):
+    __tablename__ = "reminder_log"
+    __table_args__ = (
+        UniqueConstraint("item_type", "item_id", "kind", "reminder_date", name="uq_reminder_log_item_kind_date"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    item_type: Mapped[str] = mapped_column(String, nullable=False)  # "bill"
+    item_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    kind: Mapped[str] = mapped_column(String, nullable=False)  # вид напоминания, например "due_tomorrow"
+    reminder_date: Mapped[date] = mapped_column(Date, nullable=False)  # срок, о котором напоминали; для просрочки — день напоминания
+    sent_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(MSK))
+
+
+# Аренда (lease) для выбора лидера среди процессов бота
+class Lease(Base):
+    __tablename__ = "leases"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)  # например "scheduler"
+    holder: Mapped[str] = mapped_column(String, nullable=False)  # кто держит: хост:pid:случайный суффикс
+    expires_at: Mapped[float] = mapped_column(Float, nullable=False)  # unix-время окончания аренды
+
+
+# Состояния FSM (aiogram): переживают перезапуск и общие для всех процессов бота
+class FsmState(Base):
+    __tablename__ = "fsm_states"
+    __table_args__ = (
+        # очистка просроченных записей
+        Index("ix_fsm_states_updated_at", "updated_at"),
+    )
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)  # bot:chat:user:thread:business:destiny
+    state: Mapped[str] = mapped_column(String, nullable=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=True)  # pickle: в данных бывают date и Decimal
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False)  # unix-время
@@ -1,15 +1,54 @@
 # bot/database/repository.py
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, and_, or_, case, delete, insert, update, literal, union_all, event, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, date
 import pytz
 from decimal import Decimal
 from dateutil.relativedelta import relativedelta
+from collections import namedtuple
 
-from bot.database.models import User, Transaction, Debt, Bill, DebtPayment, PaymentSchedule
+from bot.config import USER_CACHE_SIZE, USER_CACHE_TTL, REMINDER_OFFSETS, REMINDER_OVERDUE_DAYS
+from bot.database.models import User, Transaction, Debt, Bill, DebtPayment, PaymentSchedule, MonthlyRollup
+from bot.database.models import SentFile, ReminderLog, Lease, FsmState
+from bot.utils.cache import TTLCache
+from bot.utils.helpers import to_float
+from bot.utils.periods import current_period_bounds, is_month_start
 
 MSK = pytz.timezone('Europe/Moscow')
 
+# Облегчённая запись пользователя для кэша: сервисам нужен только id
+CachedUser = namedtuple("CachedUser", ["id", "telegram_id", "is_active"])
+
+# telegram_id → CachedUser, общий для всех сессий процесса
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Пользователи, созданные в ещё не закоммиченной транзакции сессии (session.info):
+# в кэш они попадают только после коммита — при откате их id не существует
+NEW_USERS_KEY = "new_users"
+# telegram_id пользователей, изменённых в незакоммиченной транзакции: из кэша они
+# удаляются после коммита — иначе параллельное чтение вернёт в кэш старую запись
+CHANGED_USERS_KEY = "changed_users"
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_users(session: Session):
+    for user in session.info.pop(NEW_USERS_KEY, {}).values():
+        # Созданный внутри откаченного SAVEPOINT пользователь из сессии уже удалён
+        if inspect(user).persistent:
+            UserRepository._remember(user)
+    # Кэш у каждого процесса свой: в остальных запись устареет не дольше чем на USER_CACHE_TTL
+    for telegram_id in session.info.pop(CHANGED_USERS_KEY, ()):
+        user_cache.invalidate(telegram_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_new_users(session: Session):
+    session.info.pop(NEW_USERS_KEY, None)
+    session.info.pop(CHANGED_USERS_KEY, None)
+
+
 class UserRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -20,7 +59,10 @@ class UserRepository:
         result = await self.session.execute(stmt)
         user = result.scalar_one_or_none()
 
-        if not user:
+        if user:
+            if not self._uncommitted(telegram_id):
+                self._remember(user)
+        else:
             # Если нет — создаём нового
             user = User(
                 telegram_id=telegram_id,
@@ -28,8 +70,9 @@ class UserRepository:
                 full_name=full_name
             )
             self.session.add(user)
-            await self.session.commit()
+            await self.session.flush()
             await self.session.refresh(user)
+            self.session.info.setdefault(NEW_USERS_KEY, {})[telegram_id] = user
 
         return user
 
@@ -42,8 +85,9 @@ class UserRepository:
         user = await self.get_user_by_id(user_id)
         if user:
             user.is_active = is_active
-            await self.session.commit()
+            await self.session.flush()
             await self.session.refresh(user)
+            self.session.info.setdefault(CHANGED_USERS_KEY, set()).add(user.telegram_id)
         return user
 
     async def get_user_by_telegram_id(self, telegram_id: int):
@@ -51,19 +95,53 @@ class UserRepository:
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def get_cached_user(self, telegram_id: int):
+        """Возвращает CachedUser по telegram_id; в БД идёт только при промахе кэша."""
+        uncommitted = self._uncommitted(telegram_id)
+        cached = None if uncommitted else user_cache.get(telegram_id)
+        if cached is not None:
+            return cached
+
+        stmt = select(User.id, User.telegram_id, User.is_active).where(User.telegram_id == telegram_id)
+        row = (await self.session.execute(stmt)).first()
+        if row is None:
+            return None
+        cached = CachedUser(*row)
+        if not uncommitted:
+            user_cache.set(telegram_id, cached)
+        return cached
+
+    async def get_data_version(self, user_id: int) -> int:
+        stmt = select(User.data_version).where(User.id == user_id)
+        result = await self.session.execute(stmt)
+        return result.scalar() or 0
+
+    def _uncommitted(self, telegram_id: int) -> bool:
+        """Пользователь создан или изменён в текущей транзакции: кэш для него не читаем и не пишем."""
+        info = self.session.info
+        return telegram_id in info.get(NEW_USERS_KEY, {}) or telegram_id in info.get(CHANGED_USERS_KEY, ())
+
+    @staticmethod
+    def _remember(user: User):
+        user_cache.set(user.telegram_id, CachedUser(user.id, user.telegram_id, user.is_active))
+
 class TransactionRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
     async def add_transaction(self, user_id: int, type: str, amount: float, description: str = None, date: str = None):
+        created_at = datetime.now(MSK)
         transaction = Transaction(
             user_id=user_id,
             type=type,
             amount=amount,
             description=description,
+            date=created_at,
         )
         self.session.add(transaction)
-        await self.session.commit()
+        # Помесячный итог обновляется в той же транзакции БД
+        await MonthlyRollupRepository(self.session).add(user_id, created_at, type, amount)
+        await self.session.flush()
         await self.session.refresh(transaction)
         return transaction
 
@@ -92,26 +170,8 @@ class TransactionRepository:
 
     @staticmethod
     def _get_period_bounds(period: str):
-        """Возвращает (start, end) для заданного периода в MSK."""
-        now = datetime.now(MSK).replace(hour=0, minute=0, second=0, microsecond=0)
-        if period == "day":
-            start = now
-            end = now + timedelta(days=1)
-        elif period == "week":
-            start = now - timedelta(days=now.weekday())
-            end = start + timedelta(weeks=1)
-        elif period == "month":
-            start = now.replace(day=1)
-            if now.month == 12:
-                end = start.replace(year=now.year + 1, month=1)
-            else:
-                end = start.replace(month=now.month + 1)
-        elif period == "year":
-            start = now.replace(month=1, day=1)
-            end = start.replace(year=now.year + 1)
-        else:
-            raise ValueError("Неверный период")
-        return start, end
+        """Возвращает (start, end) для заданного периода в MSK (см. bot.utils.periods)."""
+        return current_period_bounds(period)
 
     async def get_transactions_by_user_and_period(self, user_id: int, period: str):
         start, end = self._get_period_bounds(period)  # ← вызываем через self
@@ -123,6 +183,120 @@ class TransactionRepository:
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
+    async def stream_period_rows(self, user_id: int, period: str):
+        """Поток строк (date, type, amount, description) за период, новые сверху."""
+        start, end = self._get_period_bounds(period)
+        stmt = (
+            select(Transaction.date, Transaction.type, Transaction.amount, Transaction.description)
+            .where(
+                Transaction.user_id == user_id,
+                Transaction.date >= start,
+                Transaction.date < end
+            )
+            .order_by(Transaction.date.desc())
+        )
+        return await self.session.stream(stmt)
+
+    async def get_period_totals(self, user_id: int, period: str) -> dict:
+        """Доходы, расходы и число операций за период — один запрос с GROUP BY type."""
+        start, end = self._get_period_bounds(period)
+        return await self.get_range_totals(user_id, start, end)
+
+    async def get_range_totals(self, user_id: int, start: datetime, end: datetime) -> dict:
+        """Итоги за [start, end): диапазонное сканирование индекса (user_id, date)."""
+        if is_month_start(start) and is_month_start(end):
+            # Целые месяцы — читаем помесячные итоги вместо транзакций
+            return await MonthlyRollupRepository(self.session).get_totals(user_id, start.date(), end.date())
+
+        stmt = (
+            select(Transaction.type, func.sum(Transaction.amount), func.count(Transaction.id))
+            .where(
+                Transaction.user_id == user_id,
+                Transaction.date >= start,
+                Transaction.date < end
+            )
+            .group_by(Transaction.type)
+        )
+        result = await self.session.execute(stmt)
+
+        totals = {"income": 0.0, "expense": 0.0, "count": 0}
+        for type_, amount, count in result.all():
+            if type_ in ("income", "expense"):
+                totals[type_] = to_float(amount)
+            totals["count"] += count
+        return totals
+
+
+def monthly_rollup_backfill(user_id: int = None):
+    """INSERT ... SELECT, пересчитывающий помесячные итоги из транзакций."""
+    month = func.date(Transaction.date, "start of month")
+    source = (
+        select(
+            Transaction.user_id,
+            month,
+            Transaction.type,
+            func.sum(Transaction.amount),
+            func.count(Transaction.id)
+        )
+        .group_by(Transaction.user_id, month, Transaction.type)
+    )
+    if user_id is not None:
+        source = source.where(Transaction.user_id == user_id)
+    return insert(MonthlyRollup).from_select(
+        ["user_id", "month", "type", "total", "count"],
+        source
+    )
+
+
+class MonthlyRollupRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add(self, user_id: int, moment: datetime, type: str, amount: float):
+        stmt = sqlite_insert(MonthlyRollup).values(
+            user_id=user_id,
+            month=moment.date().replace(day=1),
+            type=type,
+            total=amount,
+            count=1
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MonthlyRollup.user_id, MonthlyRollup.month, MonthlyRollup.type],
+            set_={
+                "total": MonthlyRollup.total + stmt.excluded.total,
+                "count": MonthlyRollup.count + 1
+            }
+        )
+        await self.session.execute(stmt)
+
+    async def get_totals(self, user_id: int, start_month: date, end_month: date) -> dict:
+        """Итоги за месяцы [start_month, end_month) в формате get_period_totals."""
+        stmt = (
+            select(MonthlyRollup.type, func.sum(MonthlyRollup.total), func.sum(MonthlyRollup.count))
+            .where(
+                MonthlyRollup.user_id == user_id,
+                MonthlyRollup.month >= start_month,
+                MonthlyRollup.month < end_month
+            )
+            .group_by(MonthlyRollup.type)
+        )
+        result = await self.session.execute(stmt)
+
+        totals = {"income": 0.0, "expense": 0.0, "count": 0}
+        for type_, amount, count in result.all():
+            if type_ in ("income", "expense"):
+                totals[type_] = to_float(amount)
+            totals["count"] += count or 0
+        return totals
+
+    async def rebuild(self, user_id: int = None):
+        """Пересчитывает итоги из транзакций (все пользователи или один)."""
+        stmt = delete(MonthlyRollup)
+        if user_id is not None:
+            stmt = stmt.where(MonthlyRollup.user_id == user_id)
+        await self.session.execute(stmt)
+        await self.session.execute(monthly_rollup_backfill(user_id))
+
 class DebtRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -146,7 +320,7 @@ class DebtRepository:
             note=note
         )
         self.session.add(debt)
-        await self.session.commit()
+        await self.session.flush()
         await self.session.refresh(debt)
         return debt
 
@@ -155,6 +329,22 @@ class DebtRepository:
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
+    async def stream_active_debt_rows(self, user_id: int):
+        """Поток строк активных долгов для экспорта."""
+        stmt = (
+            select(
+                Debt.id,
+                Debt.description,
+                Debt.category,
+                Debt.note,
+                Debt.total_amount,
+                Debt.remaining_amount,
+                Debt.due_date
+            )
+            .where(Debt.user_id == user_id, Debt.is_active == True)
+        )
+        return await self.session.stream(stmt)
+
     async def get_debt_by_id(self, debt_id: int):
         stmt = select(Debt).where(Debt.id == debt_id)
         result = await self.session.execute(stmt)
@@ -184,7 +374,7 @@ class DebtRepository:
         payment = DebtPayment(debt_id=debt_id, amount=amount)
         self.session.add(payment)
 
-        await self.session.commit()
+        await self.session.flush()
         await self.session.refresh(debt)
         return debt
 
@@ -209,40 +399,68 @@ class DebtRepository:
         return enriched
 
     async def get_debt_statistics(self, user_id: int):
-        stmt = select(Debt).where(Debt.user_id == user_id)
+        """
+        Статистика по долгам пользователя.
+
+        Итоги, просрочка и разбивка по категориям считаются одним GROUP BY-запросом,
+        ближайшие сроки — выборкой ORDER BY due_date LIMIT 5 по индексу.
+        """
+        is_overdue = and_(Debt.is_active == True, Debt.due_date < date.today())
+        category_label = case(
+            (
+                and_(Debt.category == "Другое", func.coalesce(Debt.note, "") != ""),
+                "Другое (" + Debt.note + ")"
+            ),
+            else_=Debt.category
+        )
+
+        stmt = (
+            select(
+                category_label.label("category"),
+                func.count(Debt.id),
+                func.sum(Debt.total_amount),
+                func.sum(Debt.remaining_amount),
+                func.count(case((is_overdue, 1))),
+                func.sum(case((is_overdue, Debt.remaining_amount), else_=0))
+            )
+            .where(Debt.user_id == user_id)
+            .group_by(category_label)
+            .order_by(func.min(Debt.id))  # порядок категорий — как раньше, по первому долгу
+        )
         result = await self.session.execute(stmt)
-        all_debts = result.scalars().all()
-
-        total_debts = len(all_debts)
-        total_amount = sum(float(d.total_amount) for d in all_debts)
-        remaining = sum(float(d.remaining_amount) for d in all_debts)
-        paid = total_amount - remaining
-
-        # Просроченные
-        overdue_debts = [d for d in all_debts if d.is_active and d.due_date < date.today()]
-        overdue_amount = sum(float(d.remaining_amount) for d in overdue_debts)
-
-        # По категориям
-        from collections import defaultdict
-        by_category = defaultdict(lambda: {"count": 0, "total": 0.0, "paid": 0.0})
-        for d in all_debts:
-            cat = d.category if d.category != "Другое" else f"Другое ({d.note})" if d.note else "Другое"
-            by_category[cat]["count"] += 1
-            by_category[cat]["total"] += float(d.total_amount)
-            by_category[cat]["paid"] += float(d.total_amount - d.remaining_amount)
+
+        total_debts = 0
+        total_amount = remaining = overdue_amount = 0.0
+        overdue_count = 0
+        by_category = {}
+        for cat, count, cat_total, cat_remaining, cat_overdue_count, cat_overdue_amount in result.all():
+            cat_total = to_float(cat_total)
+            cat_remaining = to_float(cat_remaining)
+            by_category[cat] = {"count": count, "total": cat_total, "paid": cat_total - cat_remaining}
+
+            total_debts += count
+            total_amount += cat_total
+            remaining += cat_remaining
+            overdue_count += cat_overdue_count
+            overdue_amount += to_float(cat_overdue_amount)
 
         # Ближайшие сроки (активные, отсортированы по дате)
-        active_debts = [d for d in all_debts if d.is_active]
-        nearest = sorted(active_debts, key=lambda x: x.due_date)[:5]
+        nearest_stmt = (
+            select(Debt)
+            .where(Debt.user_id == user_id, Debt.is_active == True)
+            .order_by(Debt.due_date)
+            .limit(5)
+        )
+        nearest = (await self.session.execute(nearest_stmt)).scalars().all()
 
         return {
             "total_debts": total_debts,
             "total_amount": total_amount,
             "remaining": remaining,
-            "paid": paid,
-            "overdue_count": len(overdue_debts),
+            "paid": total_amount - remaining,
+            "overdue_count": overdue_count,
             "overdue_amount": overdue_amount,
-            "by_category": dict(by_category),
+            "by_category": by_category,
             "nearest": nearest
         }
 
@@ -293,7 +511,7 @@ class BillRepository:
             debt_id=debt_id
         )
         self.session.add(bill)
-        await self.session.commit()
+        await self.session.flush()
         await self.session.refresh(bill)
         return bill
 
@@ -366,7 +584,7 @@ class BillRepository:
                 )
                 self.session.add(next_bill)
 
-        await self.session.commit()
+        await self.session.flush()
         await self.session.refresh(bill)
         return bill
 
@@ -385,12 +603,23 @@ class BillRepository:
         result = await self.session.execute(stmt)
         return result.fetchall()
 
+    async def stream_paid_bill_rows(self, user_id: int):
+        """Поток строк (paid_at, description, amount, debt_description) оплаченных счетов."""
+        stmt = (
+            select(Bill.paid_at, Bill.description, Bill.amount, Debt.description.label("debt_description"))
+            .join(Debt, Debt.id == Bill.debt_id, isouter=True)
+            .where(Bill.user_id == user_id, Bill.is_paid == True)
+            .order_by(Bill.paid_at.desc())
+        )
+        return await self.session.stream(stmt)
+
 class DebtPaymentRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_payments_by_user(self, user_id: int):
-        stmt = (
+    @staticmethod
+    def _payments_by_user_stmt(user_id: int):
+        return (
             select(
                 DebtPayment.paid_at,
                 DebtPayment.amount,
@@ -403,9 +632,15 @@ class DebtPaymentRepository:
             .where(User.id == user_id)
             .order_by(DebtPayment.paid_at.desc())
         )
-        result = await self.session.execute(stmt)
+
+    async def get_payments_by_user(self, user_id: int):
+        result = await self.session.execute(self._payments_by_user_stmt(user_id))
         return result.mappings().fetchall()  # ← возвращает list[RowMapping]
 
+    async def stream_payments_by_user(self, user_id: int):
+        """То же, что get_payments_by_user, но потоком строк без загрузки всего списка."""
+        return await self.session.stream(self._payments_by_user_stmt(user_id))
+
     async def get_payments_by_debt(self, debt_id: int):
         stmt = select(DebtPayment).where(DebtPayment.debt_id == debt_id)
         result = await self.session.execute(stmt)
@@ -436,7 +671,7 @@ class PaymentScheduleRepository:
             self.session.add(schedule)
 
         debt.is_schedule_created = True
-        await self.session.commit()
+        await self.session.flush()
 
     async def get_unpaid_schedules_by_debt(self, debt_id: int):
         stmt = select(PaymentSchedule).where(
@@ -476,7 +711,7 @@ class PaymentScheduleRepository:
                 for s in unpaid:
                     s.amount = round(new_amount, 2)
 
-        await self.session.commit()
+        await self.session.flush()
         await self.session.refresh(schedule)
         return schedule
 
@@ -485,6 +720,21 @@ class PaymentScheduleRepository:
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def stream_schedule_rows(self, user_id: int):
+        """Поток строк (due_date, amount, is_paid, debt_description) графиков платежей."""
+        stmt = (
+            select(
+                PaymentSchedule.due_date,
+                PaymentSchedule.amount,
+                PaymentSchedule.is_paid,
+                Debt.description.label("debt_description")
+            )
+            .join(Debt, Debt.id == PaymentSchedule.debt_id)
+            .where(Debt.user_id == user_id)
+            .order_by(PaymentSchedule.due_date)
+        )
+        return await self.session.stream(stmt)
+
     async def get_schedules_by_user(self, user_id: int):
         """Получает все платежи по графикам для пользователя."""
         stmt = (
@@ -495,4 +745,223 @@ class PaymentScheduleRepository:
             .order_by(PaymentSchedule.due_date)
         )
         result = await self.session.execute(stmt)
-        return result.fetchall()
\ No newline at end of file
+        return result.fetchall()
+
+class SentFileRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_file_id(self, key: str):
+        stmt = select(SentFile.file_id).where(SentFile.content_hash == key)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def save_file_id(self, key: str, file_id: str, keep_days: int = 30):
+        stmt = sqlite_insert(SentFile).values(
+            content_hash=key,
+            file_id=file_id,
+            created_at=datetime.now(MSK)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SentFile.content_hash],
+            set_={"file_id": stmt.excluded.file_id, "created_at": stmt.excluded.created_at}
+        )
+        await self.session.execute(stmt)
+        # Старые записи больше не пригодятся: версия данных и имя файла с тех пор сменились
+        await self.session.execute(
+            delete(SentFile).where(SentFile.created_at < datetime.now(MSK) - timedelta(days=keep_days))
+        )
+
+    async def forget(self, key: str):
+        await self.session.execute(delete(SentFile).where(SentFile.content_hash == key))
+
+
+class ReminderLogRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @staticmethod
+    def sent_exists(item_type: str, item_id, kind: str, reminder_date):
+        """EXISTS-подзапрос: напоминание уже в журнале (проверка по уникальному индексу)."""
+        return (
+            select(ReminderLog.id)
+            .where(
+                ReminderLog.item_type == item_type,
+                ReminderLog.item_id == item_id,
+                ReminderLog.kind == kind,
+                ReminderLog.reminder_date == reminder_date
+            )
+            .exists()
+        )
+
+    async def add_many(self, entries: list[dict]):
+        """Пакетная запись; уже записанные напоминания пропускаются."""
+        if not entries:
+            return
+        stmt = sqlite_insert(ReminderLog).values(
+            [{**entry, "sent_at": datetime.now(MSK)} for entry in entries]
+        ).on_conflict_do_nothing()
+        await self.session.execute(stmt)
+
+
+OVERDUE = "overdue"
+
+
+def offset_kind(days: int) -> str:
+    """Вид напоминания за days дней до срока: "d7", "d1", "d0"."""
+    return f"d{days}"
+
+
+class ReminderRepository:
+    """Выборки для ежедневной сводки напоминаний по всем пользователям."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @staticmethod
+    def _kind_expr(due_date, today: date, offsets: list[int]):
+        """
+        Вид напоминания по сроку: ближайший порог, в который попал срок.
+        Если день порога пропущен (бот не работал), напоминание придёт на следующий день.
+        """
+        whens = [(due_date < today, literal(OVERDUE))]
+        whens += [(due_date <= today + timedelta(days=d), literal(offset_kind(d))) for d in sorted(offsets)]
+        return case(*whens)
+
+    @staticmethod
+    def _reminder_date_expr(due_date, today: date):
+        """
+        Дата для журнала напоминаний: для порогов — срок (каждый порог один раз),
+        для просрочки — сегодняшний день (напоминание повторяется ежедневно).
+        """
+        return case((due_date < today, literal(today)), else_=due_date)
+
+    @staticmethod
+    def _digest_stmt(today: date, offsets: list[int] = REMINDER_OFFSETS, overdue_days: int = REMINDER_OVERDUE_DAYS):
+        # Одно окно по сроку на все пороги: от самой старой просрочки до самого дальнего порога.
+        # Просрочка напоминается каждый день, но не дольше overdue_days после срока
+        window_start = today - timedelta(days=overdue_days)
+        window_end = today + timedelta(days=max(offsets))
+        sent = ReminderLogRepository.sent_exists
+
+        bill_kind = ReminderRepository._kind_expr(Bill.due_date, today, offsets)
+        bill_date = ReminderRepository._reminder_date_expr(Bill.due_date, today)
+        bills = (
+            select(
+                Bill.telegram_id.label("telegram_id"),
+                literal("bill").label("item_type"),
+                Bill.id.label("item_id"),
+                bill_kind.label("kind"),
+                Bill.description.label("description"),
+                Bill.amount.label("amount"),
+                Bill.due_date.label("due_date"),
+                bill_date.label("reminder_date"),
+            )
+            .where(Bill.is_paid == False, Bill.due_date.between(window_start, window_end))
+            .where(~sent("bill", Bill.id, bill_kind, bill_date))
+        )
+        schedule_kind = ReminderRepository._kind_expr(PaymentSchedule.due_date, today, offsets)
+        schedule_date = ReminderRepository._reminder_date_expr(PaymentSchedule.due_date, today)
+        schedules = (
+            select(
+                User.telegram_id,
+                literal("schedule"),
+                PaymentSchedule.id,
+                schedule_kind,
+                Debt.description,
+                PaymentSchedule.amount,
+                PaymentSchedule.due_date,
+                schedule_date,
+            )
+            .join(Debt, Debt.id == PaymentSchedule.debt_id)
+            .join(User, User.id == Debt.user_id)
+            .where(PaymentSchedule.is_paid == False, PaymentSchedule.due_date.between(window_start, window_end))
+            .where(~sent("schedule", PaymentSchedule.id, schedule_kind, schedule_date))
+        )
+        debts = (
+            select(
+                User.telegram_id,
+                literal("debt"),
+                Debt.id,
+                literal(OVERDUE),
+                Debt.description,
+                Debt.remaining_amount,
+                Debt.due_date,
+                literal(today),
+            )
+            .join(User, User.id == Debt.user_id)
+            .where(Debt.is_active == True, Debt.due_date >= window_start, Debt.due_date < today)
+            .where(~sent("debt", Debt.id, OVERDUE, today))
+        )
+
+        items = union_all(bills, schedules, debts).subquery()
+        return select(items).order_by(items.c.telegram_id, items.c.item_type, items.c.due_date, items.c.item_id)
+
+    async def get_digest_rows(self, today: date):
+        """
+        Строки (telegram_id, item_type, item_id, kind, description, amount, due_date, reminder_date)
+        всех ещё не отправленных напоминаний — один запрос, строки идут по пользователям.
+        """
+        result = await self.session.execute(self._digest_stmt(today))
+        return result.all()
+
+
+class LeaseRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def try_acquire(self, name: str, holder: str, ttl: float, now: float) -> bool:
+        """
+        Берёт или продлевает аренду. Удаётся, если аренда наша или просрочена.
+        Один UPDATE с условием — атомарно даже при нескольких процессах.
+        """
+        result = await self.session.execute(
+            update(Lease)
+            .where(Lease.name == name, or_(Lease.holder == holder, Lease.expires_at < now))
+            .values(holder=holder, expires_at=now + ttl)
+        )
+        if result.rowcount:
+            return True
+
+        # Аренды ещё нет — первый, кто вставит строку, становится лидером
+        result = await self.session.execute(
+            sqlite_insert(Lease).values(name=name, holder=holder, expires_at=now + ttl).on_conflict_do_nothing()
+        )
+        return bool(result.rowcount)
+
+    async def release(self, name: str, holder: str):
+        await self.session.execute(delete(Lease).where(Lease.name == name, Lease.holder == holder))
+
+
+class FsmStateRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get(self, key: str, fresh_after: float):
+        """(state, data) записи, обновлённой не раньше fresh_after, или None."""
+        stmt = select(FsmState.state, FsmState.data).where(FsmState.key == key, FsmState.updated_at >= fresh_after)
+        result = await self.session.execute(stmt)
+        return result.first()
+
+    async def save_many(self, rows: list[dict]):
+        """Пакетный upsert строк {key, state, data, updated_at}."""
+        if not rows:
+            return
+        stmt = sqlite_insert(FsmState).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FsmState.key],
+            set_={
+                "state": stmt.excluded.state,
+                "data": stmt.excluded.data,
+                "updated_at": stmt.excluded.updated_at,
+            }
+        )
+        await self.session.execute(stmt)
+
+    async def delete_many(self, keys: list[str]):
+        if keys:
+            await self.session.execute(delete(FsmState).where(FsmState.key.in_(keys)))
+
+    async def delete_expired(self, before: float) -> int:
+        result = await self.session.execute(delete(FsmState).where(FsmState.updated_at < before))
+        return result.rowcount
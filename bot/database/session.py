@@ -1,20 +1,157 @@
 # bot/database/session.py
 import os
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from bot.config import DATABASE_PATH
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from bot.config import (
+    DATABASE_PATH,
+    DB_JOURNAL_MODE,
+    DB_SYNCHRONOUS,
+    DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE,
+    DB_TEMP_STORE,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_READ_POOL_SIZE,
+)
 
 # Создаём папку, если её нет
 db_dir = os.path.dirname(DATABASE_PATH)
 os.makedirs(db_dir, exist_ok=True)
 
-# Асинхронный движок
-engine = create_async_engine(f"sqlite+aiosqlite:///{DATABASE_PATH}")
+DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+
+
+def sqlite_pragmas() -> list[str]:
+    """PRAGMA-настройки, которые выполняются на каждом новом соединении."""
+    return [
+        f"PRAGMA journal_mode={DB_JOURNAL_MODE}",
+        f"PRAGMA synchronous={DB_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}",  # отрицательное значение — размер в КиБ
+        f"PRAGMA mmap_size={DB_MMAP_SIZE}",
+        f"PRAGMA temp_store={DB_TEMP_STORE}",
+    ]
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def apply_read_only_pragmas(dbapi_connection, connection_record=None):
+    # journal_mode/synchronous задаёт пишущее соединение; смена режима читателем требует блокировки
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_pragmas():
+            if not pragma.startswith(("PRAGMA journal_mode", "PRAGMA synchronous")):
+                cursor.execute(pragma)
+        cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def create_read_engine(url: str = DATABASE_URL, pool_size: int = DB_READ_POOL_SIZE):
+    """
+    Движок для соединений только для чтения.
+
+    В режиме WAL читатели не мешают друг другу и писателю, поэтому независимые
+    выборки можно выполнять параллельно — каждую на своём соединении.
+    """
+    read_engine = create_async_engine(
+        url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=DB_POOL_TIMEOUT,
+        connect_args={"timeout": DB_BUSY_TIMEOUT_MS / 1000},
+    )
+    event.listen(read_engine.sync_engine, "connect", apply_read_only_pragmas)
+    return read_engine
+
+
+# Асинхронный движок: несколько читателей и один писатель работают параллельно (WAL)
+engine = create_async_engine(
+    DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    connect_args={"timeout": DB_BUSY_TIMEOUT_MS / 1000},
+)
+event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
 
 # Асинхронная фабрика сессий
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# Соединения только для чтения: видят закоммиченные данные, писать через них нельзя
+read_engine = create_read_engine()
+read_async_session = sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+# Сессия текущего апдейта (её открывает и коммитит DbSessionMiddleware)
+current_session: ContextVar[Optional[AsyncSession]] = ContextVar("current_session", default=None)
+
+
+@asynccontextmanager
+async def session_scope():
+    """
+    Единица работы для сервисов.
+
+    Внутри апдейта возвращает общую сессию middleware — коммит будет один, в конце апдейта.
+    Вне апдейта (планировщик, скрипты) открывает свою сессию и коммитит её на выходе.
+    """
+    session = current_session.get()
+    if session is not None:
+        yield session
+        return
+
+    async with async_session() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+@asynccontextmanager
+async def savepoint(session: AsyncSession):
+    """
+    Вложенная транзакция (SAVEPOINT): ошибка внутри откатывает только её, а не всю работу апдейта.
+
+    Драйвер sqlite3 открывает транзакцию лишь перед изменением данных, а SAVEPOINT
+    вне транзакции SQLite фиксирует сразу на выходе — поэтому сначала открываем её явно.
+    """
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    if not raw_connection.driver_connection.in_transaction:
+        await connection.exec_driver_sql("BEGIN")
+    async with session.begin_nested():
+        yield session
+
+
 async def get_session() -> AsyncSession:
+    session = current_session.get()
+    if session is not None:
+        yield session
+        return
+
     async with async_session() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+@asynccontextmanager
+async def read_session():
+    """Отдельная сессия только для чтения — не зависит от сессии апдейта и не коммитится."""
+    async with read_async_session() as session:
+        yield session
@@ -6,7 +6,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import date
 
-from services.debt_service import DebtService
+from bot.services.debt_service import DebtService
 from bot.keyboards.debts import debts_menu
 from bot.states.debt_states import DebtListStates
 
@@ -3,12 +3,12 @@
 from aiogram import Router, F
 from aiogram.types import Message
 from bot.keyboards.debts import debts_menu
-from services.debt_service import DebtService
+from bot.services.debt_service import DebtService
 from datetime import date
 
 router = Router()
 
-@router.message(F.text == "📊 Статистика")
+@router.message(F.text == "📊 Статистика", flags={"throttling": "expensive"})
 async def show_debt_stats(message: Message):
     stats = await DebtService.get_debt_statistics(message.from_user.id)
 
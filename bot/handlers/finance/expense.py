@@ -8,7 +8,7 @@ from aiogram import F
 from bot.states.finance_states import ExpenseStates
 from bot.keyboards.finance import expense_cancel_keyboard, expense_description_keyboard
 from bot.keyboards.base import main_menu
-from services.finance_service import FinanceService
+from bot.services.finance_service import FinanceService
 from bot.logger import logger
 
 router = Router()
@@ -1,35 +1,69 @@
 # bot/handlers/finance/reports.py
+
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message, BufferedInputFile
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
-from bot.keyboards.finance import report_period_keyboard, report_detail_keyboard
+from bot.keyboards.finance import report_period_keyboard, report_detail_keyboard, report_range_keyboard
 from bot.keyboards.base import main_menu
-from services.finance_service import FinanceService
-from services.export_service import ExportService
+from bot.services.finance_service import FinanceService
+from bot.services.export_service import ExportService
 from bot.logger import logger
+from bot.utils.parsers import parse_date_range
+from bot.utils.periods import make_range_period
 
 router = Router()
 
 class ReportStates(StatesGroup):
     viewing_report = State()
+    waiting_for_range = State()
+
+PERIOD_BUTTONS = {
+    "📅 Сегодня": "day",
+    "📅 Неделя": "week",
+    "📅 Месяц": "month",
+    "📅 Прошлый месяц": "prev_month",
+    "📅 Квартал": "quarter",
+    "📅 Год": "year"
+}
 
 @router.message(F.text == "📊 Отчёты")
 async def show_reports_menu(message: Message):
     await message.answer("Выберите период для отчёта:", reply_markup=report_period_keyboard)
 
-@router.message(F.text.in_({"📅 Сегодня", "📅 Неделя", "📅 Месяц", "📅 Год"}))
+@router.message(F.text.in_(PERIOD_BUTTONS.keys()), flags={"throttling": "low"})
 async def handle_report_period(message: Message, state: FSMContext):
-    period_map = {
-        "📅 Сегодня": "day",
-        "📅 Неделя": "week",
-        "📅 Месяц": "month",
-        "📅 Год": "year"
-    }
-    period_key = message.text
-    period = period_map[period_key]
+    await send_period_report(message, state, PERIOD_BUTTONS[message.text])
+
+
+@router.message(F.text == "📆 Свой период")
+async def ask_report_range(message: Message, state: FSMContext):
+    await state.set_state(ReportStates.waiting_for_range)
+    await message.answer(
+        "Введите период в формате ДД.ММ.ГГГГ - ДД.ММ.ГГГГ\n"
+        "Например: 01.01.2025 - 31.03.2025",
+        reply_markup=report_range_keyboard
+    )
+
+
+@router.message(ReportStates.waiting_for_range)
+async def handle_report_range(message: Message, state: FSMContext):
+    if message.text == "❌ Отмена":
+        await state.clear()
+        await message.answer("Выберите период для отчёта:", reply_markup=report_period_keyboard)
+        return
 
+    date_range = parse_date_range(message.text or "")
+    if date_range is None:
+        await message.answer("Неверный формат. Введите период как 01.01.2025 - 31.03.2025")
+        return
+
+    await send_period_report(message, state, make_range_period(*date_range))
+
+
+async def send_period_report(message: Message, state: FSMContext, period: str):
     result = await FinanceService.get_balance_report(
         telegram_id=message.from_user.id,
         period=period
@@ -56,6 +90,20 @@ async def handle_report_period(message: Message, state: FSMContext):
         f"Количество операций: {result['count']}"
     )
 
+    previous = result.get("previous")
+    if previous:
+        def format_delta(current, before):
+            delta = float(current) - float(before)
+            sign = "+" if delta > 0 else ("−" if delta < 0 else "")
+            return sign + format_money(abs(delta))
+
+        response += (
+            f"\n\n🔁 К прошлому периоду ({previous['title']}):\n"
+            f"Доходы: {format_delta(result['income'], previous['income'])}\n"
+            f"Расходы: {format_delta(result['expense'], previous['expense'])}\n"
+            f"Баланс: {format_delta(result['balance'], previous['balance'])}"
+        )
+
     # ✅ Сохраняем период и устанавливаем состояние
     await state.update_data(report_period=period)
     await state.set_state(ReportStates.viewing_report)
@@ -64,7 +112,7 @@ async def handle_report_period(message: Message, state: FSMContext):
     await message.answer(response, reply_markup=report_detail_keyboard)
 
 
-@router.message(ReportStates.viewing_report, F.text == "📤 Экспорт в Excel")
+@router.message(ReportStates.viewing_report, F.text == "📤 Экспорт в Excel", flags={"throttling": "expensive"})
 async def export_report_excel(message: Message, state: FSMContext):
     data = await state.get_data()
     period = data.get("report_period")
@@ -83,15 +131,34 @@ async def export_report_excel(message: Message, state: FSMContext):
     if result is None:
         await message.answer("Нет данных для экспорта за этот период.", reply_markup=main_menu)
     else:
-        excel_file, filename = result
-        excel_bytes = excel_file.getvalue()
-
-        document = BufferedInputFile(file=excel_bytes, filename=filename)
-        await message.answer_document(document=document, caption="📄 Ваш финансовый отчёт.")
+        await send_export_document(message, result.file.getvalue(), result.filename, result.key)
         await message.answer("Главное меню:", reply_markup=main_menu)
 
     await state.clear()
 
+async def send_export_document(message: Message, content: bytes, filename: str, key: str | None):
+    """
+    Отправляет файл отчёта. Если отчёт с тем же ключом (см. ExportFile) уже уходил
+    в Telegram, отправляем его по file_id — без повторной загрузки.
+    """
+    caption = "📄 Ваш финансовый отчёт."
+
+    file_id = await ExportService.get_sent_file_id(key) if key else None
+    if file_id:
+        try:
+            await message.answer_document(document=file_id, caption=caption)
+            return
+        except TelegramBadRequest as e:
+            # file_id мог устареть — забываем его и загружаем файл заново
+            logger.warning(f"Не удалось отправить отчёт по file_id: {e}")
+            await ExportService.forget_sent_file(key)
+
+    document = BufferedInputFile(file=content, filename=filename)
+    sent = await message.answer_document(document=document, caption=caption)
+    if key and sent.document:
+        await ExportService.remember_sent_file(key, sent.document.file_id)
+
+
 @router.message(ReportStates.viewing_report, F.text == "🔙 Назад")
 async def back_from_report_detail(message: Message, state: FSMContext):
     await state.clear()
@@ -26,7 +26,8 @@ report_period_keyboard = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="📅 Сегодня")],
         [KeyboardButton(text="📅 Неделя"), KeyboardButton(text="📅 Месяц")],
-        [KeyboardButton(text="📅 Год")],
+        [KeyboardButton(text="📅 Прошлый месяц"), KeyboardButton(text="📅 Квартал")],
+        [KeyboardButton(text="📅 Год"), KeyboardButton(text="📆 Свой период")],
         [KeyboardButton(text="🔙 Назад")]
     ],
     resize_keyboard=True,
@@ -40,4 +41,11 @@ report_detail_keyboard = ReplyKeyboardMarkup(
     ],
     resize_keyboard=True,
     one_time_keyboard=False
-)
\ No newline at end of file
+)
+report_range_keyboard = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="❌ Отмена")]
+    ],
+    resize_keyboard=True,
+    one_time_keyboard=True
+)
@@ -1,10 +1,10 @@
 # bot/logger.py
 import logging
 import os
-from bot.config import PROJECT_ROOT  # Используем PROJECT_ROOT из config
+from bot.config import LOG_DIR
 
 # Убедимся, что папка logs существует
-log_dir = os.path.join(PROJECT_ROOT, "data", "logs")
+log_dir = LOG_DIR
 os.makedirs(log_dir, exist_ok=True)
 
 # Настраиваем логгер
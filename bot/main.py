@@ -1,37 +1,107 @@
 # bot/main.py
 import asyncio
 import logging
+from contextlib import asynccontextmanager
+from typing import Callable
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from scheduler.jobs import send_bill_reminders
 
-from bot.config import BOT_TOKEN
+from bot.config import BOT_TOKEN, BOT_MODE, HANDLER_CONCURRENCY, FSM_STORAGE
 from bot.handlers import register_all_routers
 from bot.logger import logger  # подключим, чтобы инициализировать
 from bot.database import create_db_and_tables
+from bot.database.fsm_storage import SQLiteStorage
+from bot.database.session import engine, read_engine
+from bot.middleware import (
+    DbSessionMiddleware,
+    CommitBeforeRequestMiddleware,
+    ConcurrencyLimitMiddleware,
+    ChatOrderIsolation,
+    ThrottlingMiddleware,
+)
+from bot.scheduler.jobs import set_bot
+from bot.scheduler.leader import LeaderElector
+from bot.scheduler.setup import LEADER_LEASE_NAME, create_scheduler, start_scheduler, pause_scheduler, stop_scheduler
+from bot.services.export_pool import export_pool
+from bot.webhook import run_webhook
 
 # Включаем логирование (опционально)
 logging.basicConfig(level=logging.INFO)
 
-async def main():
+def create_bot() -> Bot:
     bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+    # Транзакция апдейта не держит блокировку SQLite, пока идут запросы к Telegram
+    bot.session.middleware(CommitBeforeRequestMiddleware())
+    return bot
 
-    # Планировщик
-    scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
-    scheduler.add_job(send_bill_reminders, "cron", hour=9, minute=0, args=[bot])
-    scheduler.start()
 
-        # Создаём таблицы при запуске
-    await create_db_and_tables()
+def create_dispatcher(workers: int = 1, backlog: Callable[[], int] = lambda: 0) -> Dispatcher:
+    """
+    workers — сколько процессов-обработчиков делят общие лимиты, backlog — размер
+    очереди апдейтов процесса (см. bot/supervisor.py).
+    """
+    # Состояния диалогов переживают перезапуск: SQLite с кэшем в памяти
+    storage = SQLiteStorage() if FSM_STORAGE == "sqlite" else MemoryStorage()
+    # Апдейты одного чата — по очереди, состояние FSM читается уже в очереди чата
+    dp = Dispatcher(storage=storage, events_isolation=ChatOrderIsolation())
+
+    # Не больше HANDLER_CONCURRENCY апдейтов в работе; одна сессия БД на апдейт, один коммит в конце
+    limiter = ConcurrencyLimitMiddleware(HANDLER_CONCURRENCY, backlog)
+    dp.update.outer_middleware(limiter)
+    dp.update.outer_middleware(DbSessionMiddleware())
+
+    # Лимиты частоты на чат и на процесс; отчёты откладываются, когда очередь слишком длинная
+    throttling = ThrottlingMiddleware(limiter, workers=workers)
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
     register_all_routers(dp)
+    return dp
+
 
+@asynccontextmanager
+async def bot_runtime(bot: Bot):
+    """
+    Фоновые службы процесса бота: выбор лидера и планировщик; на выходе —
+    остановка служб и закрытие пулов (сборка отчётов, соединения с БД).
+    """
+    # Планировщик: задачи в постоянном хранилище, пропущенные запуски догоняются один раз.
+    # Процессов может быть несколько — задачи выполняет только держатель аренды (лидер)
+    set_bot(bot)
+    scheduler = create_scheduler()
+    elector = LeaderElector(
+        LEADER_LEASE_NAME,
+        on_elected=lambda: start_scheduler(scheduler),
+        on_demoted=lambda: pause_scheduler(scheduler),
+    )
+    elector_task = asyncio.create_task(elector.run())
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
-    except Exception as e:
-        logger.error(f"Критическая ошибка при запуске: {e}", exc_info=True)
+        yield
+    finally:
+        await elector.stop()
+        await elector_task
+        stop_scheduler(scheduler)
+        await bot.session.close()
+        export_pool.shutdown()
+        await read_engine.dispose()
+        await engine.dispose()
+
+
+async def main():
+    bot = create_bot()
+
+        # Создаём таблицы при запуске
+    await create_db_and_tables()
+    dp = create_dispatcher()
+
+    async with bot_runtime(bot):
+        try:
+            if BOT_MODE == "webhook":
+                await run_webhook(dp, bot)
+            else:
+                await bot.delete_webhook(drop_pending_updates=True)
+                await dp.start_polling(bot)
+        except Exception as e:
+            logger.error(f"Критическая ошибка при запуске: {e}", exc_info=True)
 
 if __name__ == "__main__":
     try:
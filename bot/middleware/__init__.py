@@ -0,0 +1,5 @@
+# bot/middleware/__init__.py
+from .session_middleware import DbSessionMiddleware, CommitBeforeRequestMiddleware
+from .concurrency_middleware import ConcurrencyLimitMiddleware
+from .chat_order import ChatOrderIsolation
+from .throttling_middleware import ThrottlingMiddleware
@@ -0,0 +1,56 @@
+# bot/middleware/chat_order.py
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Dict
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+
+
+class _ChatLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0  # апдейты чата в работе и в ожидании
+
+
+class ChatOrderIsolation(BaseEventIsolation):
+    """
+    Апдейты одного чата обрабатываются строго по очереди, разные чаты — параллельно.
+
+    Иначе два быстрых нажатия «💳 Оплатить счёт» гоняются внутри pay_bill: оба видят
+    счёт неоплаченным и оба создают следующий. asyncio.Lock пропускает ожидающих
+    в порядке прихода. Замок чата живёт, пока у чата есть апдейты, и удаляется
+    сразу после последнего — память растёт только с числом активных чатов.
+
+    Передаётся в Dispatcher(events_isolation=...): замок берёт FSMContextMiddleware
+    и читает состояние FSM уже под ним, поэтому следующий апдейт чата видит
+    состояние, записанное предыдущим. Это самый внешний middleware апдейтов —
+    следующий апдейт чата начинается и после коммита предыдущего.
+    """
+
+    def __init__(self):
+        self._locks: Dict[int, _ChatLock] = {}
+
+    @property
+    def active_chats(self) -> int:
+        # Не __len__: Dispatcher проверяет events_isolation на истинность
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        # Ключ хранилища FSM — пользователь в чате; очередь общая на весь чат
+        chat_lock = self._locks.get(key.chat_id)
+        if chat_lock is None:
+            chat_lock = self._locks[key.chat_id] = _ChatLock()
+        chat_lock.users += 1
+        try:
+            async with chat_lock.lock:
+                yield
+        finally:
+            chat_lock.users -= 1
+            if chat_lock.users == 0:
+                del self._locks[key.chat_id]
+
+    async def close(self) -> None:
+        pass
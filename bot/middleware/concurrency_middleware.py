@@ -0,0 +1,51 @@
+# bot/middleware/concurrency_middleware.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """
+    Ограничивает число апдейтов, которые обрабатываются одновременно.
+
+    И polling, и webhook запускают каждый апдейт отдельной задачей, так что при
+    всплеске нагрузки задач может стать сколько угодно. Здесь лишние ждут своей
+    очереди, а БД и пул экспорта не получают больше limit запросов сразу.
+
+    backlog — сколько апдейтов ждёт ещё до этого middleware. В процессе-обработчике
+    супервизора это его очередь: он берёт из неё не больше апдейтов, чем limit,
+    и семафор здесь не ждёт никогда — вся очередь там.
+    """
+
+    def __init__(self, limit: int, backlog: Callable[[], int] = lambda: 0):
+        self.limit = limit
+        self.backlog = backlog
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+
+    @property
+    def depth(self) -> int:
+        """Апдейты, ждущие обработки: у семафора и во внешней очереди."""
+        return self.waiting + self.backlog()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.active -= 1
+            self._semaphore.release()
@@ -0,0 +1,64 @@
+# bot/middleware/session_middleware.py
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from bot.database.session import async_session, current_session
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Одна сессия БД на апдейт (unit of work).
+
+    Сессия передаётся хендлерам как аргумент ``session`` и сервисам через
+    ``session_scope()``; изменения фиксируются коммитом после хендлера, а если
+    хендлер отвечает пользователю — ещё и перед ответом (CommitBeforeRequestMiddleware).
+    """
+
+    def __init__(self, session_factory=async_session):
+        self.session_factory = session_factory
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self.session_factory() as session:
+            token = current_session.set(session)
+            data["session"] = session
+            try:
+                result = await handler(event, data)
+                await session.commit()
+                return result
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                current_session.reset(token)
+
+
+class CommitBeforeRequestMiddleware(BaseRequestMiddleware):
+    """
+    Коммитит сессию апдейта перед каждым запросом к Telegram.
+
+    Хендлеры сначала пишут в БД, потом отвечают. Без этого транзакция SQLite —
+    и блокировка записи — держалась бы всё время HTTP-запроса, а остальные
+    писатели ждали бы busy_timeout. Записанное до ответа фиксируется, даже если
+    хендлер упадёт позже: пользователь уже увидел результат.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        session = current_session.get()
+        if session is not None and session.in_transaction():
+            await session.commit()
+        return await make_request(bot, method)
@@ -0,0 +1,152 @@
+# bot/middleware/throttling_middleware.py
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import CallbackQuery, TelegramObject
+
+from bot.config import (
+    THROTTLE_CHAT_RATE,
+    THROTTLE_CHAT_BURST,
+    THROTTLE_GLOBAL_RATE,
+    THROTTLE_GLOBAL_BURST,
+    THROTTLE_EXPENSIVE_RATE,
+    THROTTLE_EXPENSIVE_BURST,
+    THROTTLE_CHATS,
+    THROTTLE_NOTICE_INTERVAL,
+    SHED_QUEUE_DEPTH,
+)
+from bot.logger import logger
+from bot.utils.rate_limit import TokenBucket
+
+TOO_FAST_TEXT = "⏳ Слишком много запросов подряд. Подождите пару секунд."
+BUSY_TEXT = "⏳ Бот сейчас перегружен. Попробуйте через минуту."
+EXPENSIVE_TEXT = "⏳ Этот отчёт можно запросить снова через {seconds} сек."
+
+
+class _ChatLimits:
+    __slots__ = ("chat", "expensive", "noticed_at")
+
+    def __init__(self, chat: TokenBucket, expensive: TokenBucket):
+        self.chat = chat
+        self.expensive = expensive
+        self.noticed_at = float("-inf")
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничивает частоту апдейтов: ведро токенов на чат и одно общее на бота.
+
+    Общее ведро живёт в процессе: при нескольких процессах-обработчиках каждый
+    получает свою долю THROTTLE_GLOBAL_* (workers), чтобы в сумме лимит не рос.
+
+    Хендлеры помечаются флагом ``throttling``:
+    - ``"expensive"`` — тяжёлая работа (экспорт в Excel, статистика), у чата для неё
+      отдельное строгое ведро;
+    - ``"low"`` — обычные отчёты.
+
+    Помеченная работа — низкого приоритета: когда обработки ждут shed_depth апдейтов
+    и больше (ConcurrencyLimitMiddleware.depth — у семафора и в очереди процесса-
+    обработчика), она не выполняется, пользователь получает просьбу повторить позже.
+    Ввод в диалогах и меню не откладываются. Предупреждения чату —
+    не чаще notice_interval, чтобы ответы на спам сами не стали нагрузкой; на
+    отброшенный callback отвечаем всегда (без текста, если предупреждение не положено).
+
+    Регистрируется как inner middleware (dp.message.middleware): там уже известен хендлер и его флаги.
+    """
+
+    def __init__(
+        self,
+        limiter=None,
+        chat_rate: float = THROTTLE_CHAT_RATE,
+        chat_burst: float = THROTTLE_CHAT_BURST,
+        global_rate: float = THROTTLE_GLOBAL_RATE,
+        global_burst: float = THROTTLE_GLOBAL_BURST,
+        expensive_rate: float = THROTTLE_EXPENSIVE_RATE,
+        expensive_burst: float = THROTTLE_EXPENSIVE_BURST,
+        shed_depth: int = SHED_QUEUE_DEPTH,
+        max_chats: int = THROTTLE_CHATS,
+        notice_interval: float = THROTTLE_NOTICE_INTERVAL,
+        workers: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limiter = limiter
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.expensive_rate = expensive_rate
+        self.expensive_burst = expensive_burst
+        self.shed_depth = shed_depth
+        self.max_chats = max_chats
+        self.notice_interval = notice_interval
+        self._clock = clock
+        self._global = TokenBucket(global_rate / workers, max(1.0, global_burst / workers), clock)
+        self._chats: "OrderedDict[int, _ChatLimits]" = OrderedDict()
+        self.throttled = 0
+        self.shed = 0
+
+    def _limits(self, chat_id: int) -> _ChatLimits:
+        limits = self._chats.get(chat_id)
+        if limits is None:
+            # Вытесняем давно молчавшие чаты: их вёдра всё равно уже полны
+            limits = self._chats[chat_id] = _ChatLimits(
+                TokenBucket(self.chat_rate, self.chat_burst, self._clock),
+                TokenBucket(self.expensive_rate, self.expensive_burst, self._clock),
+            )
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return limits
+
+    async def _notice(self, event: TelegramObject, limits: _ChatLimits, text: str):
+        now = self._clock()
+        due = now - limits.noticed_at >= self.notice_interval
+        if due:
+            limits.noticed_at = now
+        try:
+            if isinstance(event, CallbackQuery):
+                # На callback отвечаем всегда — иначе на кнопке крутится индикатор загрузки
+                await event.answer(text if due else None)
+            elif due:
+                await event.answer(text)
+        except TelegramAPIError as e:
+            logger.warning(f"Не удалось отправить предупреждение о лимите: {e}")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        chat = data.get("event_chat") or data.get("event_from_user")
+        if chat is None:
+            return await handler(event, data)
+
+        limits = self._limits(chat.id)
+        priority: Optional[str] = get_flag(data, "throttling")
+
+        if priority and self.limiter is not None and self.limiter.depth >= self.shed_depth:
+            self.shed += 1
+            await self._notice(event, limits, BUSY_TEXT)
+            return None
+
+        if not limits.chat.try_acquire():
+            self.throttled += 1
+            await self._notice(event, limits, TOO_FAST_TEXT)
+            return None
+
+        if priority == "expensive" and not limits.expensive.try_acquire():
+            self.throttled += 1
+            await self._notice(event, limits, EXPENSIVE_TEXT.format(seconds=math.ceil(limits.expensive.delay())))
+            return None
+
+        if not self._global.try_acquire():
+            self.shed += 1
+            await self._notice(event, limits, BUSY_TEXT)
+            return None
+
+        return await handler(event, data)
@@ -0,0 +1,64 @@
+# scheduler/digest.py
+"""Текст ежедневной сводки: все напоминания пользователя одним сообщением."""
+from datetime import date
+
+# Сообщение Telegram ограничено 4096 символами: длинная сводка делится на несколько
+# сообщений, а то, что не влезло и в них, уходит в следующей сводке
+MAX_MESSAGE_LENGTH = 4096
+MAX_MESSAGES_PER_USER = 5
+MAX_DESCRIPTION_LENGTH = 100
+
+HEADER = "🔔 Напоминание!"
+CONTINUATION_HEADER = "🔔 Напоминание (продолжение)"
+
+SECTIONS = [
+    ("bill", "🧾 Счета к оплате:"),
+    ("schedule", "📆 Платежи по графику:"),
+    ("debt", "⚠️ Просроченные долги:"),
+]
+
+
+def _when(due_date: date, today: date) -> str:
+    days = (due_date - today).days
+    if days < 0:
+        return "просрочен"
+    if days == 0:
+        return "сегодня"
+    if days == 1:
+        return "завтра"
+    return f"через {days} дн."
+
+
+def _line(row, today: date) -> str:
+    description = row.description
+    if len(description) > MAX_DESCRIPTION_LENGTH:
+        description = description[:MAX_DESCRIPTION_LENGTH - 1] + "…"
+    amount = f"{float(row.amount):,.2f}".replace(",", " ")
+    return f"• {description} — {amount} руб., {_when(row.due_date, today)} ({row.due_date.strftime('%d.%m.%Y')})"
+
+
+def render_digest(rows, today: date) -> list:
+    """
+    rows — строки одного пользователя из ReminderRepository.get_digest_rows.
+
+    Возвращает [(текст, строки в этом сообщении)]: в журнал напоминаний
+    записываются только строки, которые пользователь действительно увидел.
+    """
+    messages = []
+    text, shown, section = HEADER, [], None
+    for item_type, title in SECTIONS:
+        for row in (row for row in rows if row.item_type == item_type):
+            line = _line(row, today)
+            addition = "\n" + line if section == item_type else "\n\n" + title + "\n" + line
+            if len(text) + len(addition) > MAX_MESSAGE_LENGTH:
+                messages.append((text, shown))
+                if len(messages) == MAX_MESSAGES_PER_USER:
+                    return messages
+                text, shown = CONTINUATION_HEADER, []
+                addition = "\n\n" + title + "\n" + line
+            text += addition
+            shown.append(row)
+            section = item_type
+    if shown:
+        messages.append((text, shown))
+    return messages
@@ -0,0 +1,106 @@
+# scheduler/dispatcher.py
+import asyncio
+from dataclasses import dataclass, field
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramNetworkError,
+    TelegramServerError,
+    TelegramAPIError,
+)
+
+from bot.config import REMINDER_RATE, REMINDER_BURST, REMINDER_CONCURRENCY, REMINDER_MAX_RETRIES, REMINDER_MAX_THROTTLES
+from bot.logger import logger
+from bot.utils.rate_limit import TokenBucket
+
+
+@dataclass
+class OutgoingMessage:
+    chat_id: int
+    text: str
+    key: object = None  # что именно отправляем (для учёта отправленного)
+
+
+@dataclass
+class DispatchStats:
+    sent: int = 0
+    failed: int = 0
+    throttled: int = 0  # сколько раз Telegram ответил RetryAfter
+    retried: int = 0
+    delivered: list = field(default_factory=list)  # ключи успешно отправленных сообщений
+
+    def __str__(self):
+        return f"отправлено {self.sent}, ошибок {self.failed}, ограничений {self.throttled}, повторов {self.retried}"
+
+
+class ReminderDispatcher:
+    """
+    Рассылка сообщений с ограничением частоты.
+
+    Общее ведро токенов держит темп ниже лимита Telegram, семафор ограничивает число
+    одновременных запросов. На RetryAfter рассылка целиком встаёт на паузу, которую
+    назвал Telegram (для одного сообщения — не больше max_throttles раз, дальше оно
+    считается неотправленным); сетевые и серверные ошибки повторяются с растущей задержкой.
+    Остальные ошибки API (бот заблокирован, чат не найден) не повторяются.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        rate: float = REMINDER_RATE,
+        burst: int = REMINDER_BURST,
+        concurrency: int = REMINDER_CONCURRENCY,
+        max_retries: int = REMINDER_MAX_RETRIES,
+        retry_delay: float = 1.0,
+        max_throttles: int = REMINDER_MAX_THROTTLES,
+    ):
+        self.bot = bot
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_throttles = max_throttles
+
+    async def send_all(self, messages, on_sent=None) -> DispatchStats:
+        """Рассылает сообщения; on_sent(message) вызывается после каждой успешной отправки."""
+        stats = DispatchStats()
+        await asyncio.gather(*(self._send(message, stats, on_sent) for message in messages))
+        return stats
+
+    async def _send(self, message: OutgoingMessage, stats: DispatchStats, on_sent=None):
+        attempt = throttles = 0
+        async with self.semaphore:
+            while True:
+                await self.bucket.acquire()
+                try:
+                    await self.bot.send_message(chat_id=message.chat_id, text=message.text)
+                except TelegramRetryAfter as e:
+                    # Отдельный счётчик: Telegram сам сказал, когда можно продолжить
+                    stats.throttled += 1
+                    self.bucket.pause(e.retry_after)
+                    throttles += 1
+                    if throttles > self.max_throttles:
+                        stats.failed += 1
+                        logger.error(f"Сообщение в чат {message.chat_id} не отправлено: Telegram раз за разом ограничивает частоту")
+                        return
+                    continue
+                except (TelegramNetworkError, TelegramServerError) as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        stats.failed += 1
+                        logger.error(f"Не удалось отправить сообщение в чат {message.chat_id}: {e}")
+                        return
+                    stats.retried += 1
+                    await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+                    continue
+                except TelegramAPIError as e:
+                    stats.failed += 1
+                    logger.warning(f"Сообщение в чат {message.chat_id} не доставлено: {e}")
+                    return
+
+                stats.sent += 1
+                stats.delivered.append(message.key)
+                if on_sent is not None:
+                    await on_sent(message)
+                return
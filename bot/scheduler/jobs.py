@@ -1,37 +1,74 @@
 # scheduler/jobs.py
+import asyncio
+from datetime import datetime
+from itertools import groupby
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from datetime import date, timedelta
+import pytz
 from aiogram import Bot
-from services.bill_service import BillService
-
-async def send_bill_reminders(bot: Bot):
-    """Отправляет напоминания за 1 день до срока счёта."""
-    from database.repository import BillRepository
-    from database.session import get_session
-
-    tomorrow = date.today() + timedelta(days=1)
-
-    async for session in get_session():
-        # Получаем все неоплаченные счета на завтра
-        stmt = select(Bill).where(
-            Bill.due_date == tomorrow,
-            Bill.is_paid == False
-        )
-        result = await session.execute(stmt)
-        bills = result.scalars().all()
-
-        for bill in bills:
-            try:
-                await bot.send_message(
-                    chat_id=bill.user_id,  # ⚠️ нужно хранить telegram_id, а не user_id!
-                    text=(
-                        "🔔 Напоминание!\n\n"
-                        f"Завтра нужно оплатить счёт:\n"
-                        f"🧾 {bill.description}\n"
-                        f"💵 {bill.amount:,.2f} руб.\n"
-                        f"📅 {bill.due_date.strftime('%d.%m.%Y')}"
-                    )
-                )
-            except Exception as e:
-                logger.error(f"Не удалось отправить напоминание пользователю {bill.user_id}: {e}")
\ No newline at end of file
+
+from bot.database.repository import ReminderRepository
+from bot.database.session import session_scope
+from bot.logger import logger
+from bot.scheduler.digest import render_digest
+from bot.scheduler.dispatcher import ReminderDispatcher, OutgoingMessage, DispatchStats
+from bot.scheduler.ledger import ReminderLedger
+
+MSK = pytz.timezone('Europe/Moscow')
+
+# Задачи хранятся в БД планировщика и не могут ссылаться на объект Bot — берут его отсюда
+_bot: Bot | None = None
+# Догоняющий и плановый запуски не должны идти одновременно
+_digest_lock = asyncio.Lock()
+
+
+def set_bot(bot: Bot):
+    global _bot
+    _bot = bot
+
+
+async def send_daily_digest(bot: Bot = None, dispatcher: ReminderDispatcher = None) -> DispatchStats:
+    """
+    Ежедневная сводка: одно сообщение на пользователя со счетами и платежами,
+    срок которых попал в один из порогов REMINDER_OFFSETS, и с просрочками.
+
+    Берёт только напоминания без записи в reminder_log, поэтому повторный запуск
+    (после перезапуска бота или догоняющий при старте) ничего не дублирует.
+    """
+    async with _digest_lock:
+        return await _send_daily_digest(bot or _bot, dispatcher)
+
+
+async def _send_daily_digest(bot: Bot, dispatcher: ReminderDispatcher = None) -> DispatchStats:
+    today = datetime.now(MSK).date()
+
+    async with session_scope() as session:
+        rows = await ReminderRepository(session).get_digest_rows(today)
+
+    # Строки уже упорядочены по пользователю — группируем за один проход
+    messages = []
+    for telegram_id, user_rows in groupby(rows, key=lambda row: row.telegram_id):
+        for text, shown in render_digest(list(user_rows), today):
+            messages.append(OutgoingMessage(
+                chat_id=telegram_id,
+                text=text,
+                key=[(row.item_type, row.item_id, row.kind, row.reminder_date) for row in shown]
+            ))
+
+    ledger = ReminderLedger()
+
+    async def on_sent(message: OutgoingMessage):
+        for item_type, item_id, kind, reminder_date in message.key:
+            await ledger.record(item_type, item_id, kind, reminder_date)
+
+    dispatcher = dispatcher or ReminderDispatcher(bot)
+    try:
+        stats = await dispatcher.send_all(messages, on_sent=on_sent)
+    finally:
+        await ledger.flush()
+    logger.info(f"Ежедневная сводка за {today.strftime('%d.%m.%Y')}: {len(rows)} напоминаний, {stats}")
+    return stats
+
+
+def is_reminder_time_passed(hour: int) -> bool:
+    """Сегодняшняя рассылка уже должна была пройти — при старте её нужно догнать."""
+    return datetime.now(MSK).hour >= hour
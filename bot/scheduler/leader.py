@@ -0,0 +1,94 @@
+# scheduler/leader.py
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Callable
+
+from bot.config import SCHEDULER_LEASE_TTL, SCHEDULER_LEASE_RENEW
+from bot.database.repository import LeaseRepository
+from bot.database.session import session_scope
+from bot.logger import logger
+
+
+def default_holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderElector:
+    """
+    Выбор лидера через аренду в БД.
+
+    Каждый процесс раз в renew_interval пытается взять или продлить аренду name.
+    Держит её тот, кто успел первым; если лидер перестал продлевать (упал, завис),
+    через ttl секунд аренду забирает другой процесс. on_elected/on_demoted
+    вызываются при смене роли.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        on_elected: Callable[[], None],
+        on_demoted: Callable[[], None],
+        holder: str = None,
+        ttl: float = SCHEDULER_LEASE_TTL,
+        renew_interval: float = SCHEDULER_LEASE_RENEW,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.name = name
+        self.holder = holder or default_holder_id()
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._clock = clock
+        self._stopped = asyncio.Event()
+        self.is_leader = False
+        self._lease_until = 0.0  # до какого момента аренда точно наша
+
+    async def _try_acquire(self) -> bool:
+        now = self._clock()
+        async with session_scope() as session:
+            acquired = await LeaseRepository(session).try_acquire(self.name, self.holder, self.ttl, now)
+        if acquired:
+            self._lease_until = now + self.ttl
+        return acquired
+
+    async def tick(self):
+        """Одна попытка взять/продлить аренду и смена роли по результату."""
+        try:
+            acquired = await self._try_acquire()
+        except Exception as e:
+            # БД недоступна: пока аренда не истекла, лидер остаётся лидером
+            logger.error(f"Не удалось продлить аренду {self.name}: {e}")
+            acquired = self.is_leader and self._clock() < self._lease_until
+
+        if acquired and not self.is_leader:
+            self.is_leader = True
+            logger.info(f"Процесс {self.holder} стал лидером ({self.name})")
+            self._on_elected()
+        elif not acquired and self.is_leader:
+            self.is_leader = False
+            logger.warning(f"Процесс {self.holder} потерял лидерство ({self.name})")
+            self._on_demoted()
+
+    async def run(self):
+        while not self._stopped.is_set():
+            await self.tick()
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.renew_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        """Останавливает продление и отдаёт аренду, чтобы другой процесс не ждал ttl."""
+        self._stopped.set()
+        if self.is_leader:
+            self.is_leader = False
+            self._on_demoted()
+            try:
+                async with session_scope() as session:
+                    await LeaseRepository(session).release(self.name, self.holder)
+            except Exception as e:
+                logger.error(f"Не удалось освободить аренду {self.name}: {e}")
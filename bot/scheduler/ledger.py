@@ -0,0 +1,36 @@
+# scheduler/ledger.py
+from bot.config import REMINDER_LEDGER_BATCH
+from bot.database.repository import ReminderLogRepository
+from bot.database.session import session_scope
+
+
+class ReminderLedger:
+    """
+    Пишет отправленные напоминания в reminder_log пачками по мере отправки.
+
+    Если процесс упадёт посреди рассылки, повторный запуск отправит только то,
+    чего нет в журнале (в худшем случае — повторит последнюю незаписанную пачку).
+    """
+
+    def __init__(self, batch_size: int = REMINDER_LEDGER_BATCH):
+        self.batch_size = batch_size
+        self._pending: list[dict] = []
+        self.written = 0
+
+    async def record(self, item_type: str, item_id: int, kind: str, reminder_date):
+        self._pending.append({
+            "item_type": item_type,
+            "item_id": item_id,
+            "kind": kind,
+            "reminder_date": reminder_date,
+        })
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        entries, self._pending = self._pending, []
+        if not entries:
+            return
+        async with session_scope() as session:
+            await ReminderLogRepository(session).add_many(entries)
+        self.written += len(entries)
@@ -0,0 +1,75 @@
+# scheduler/setup.py
+import os
+
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+
+from bot.config import REMINDER_HOUR, SCHEDULER_DB_PATH, SCHEDULER_MISFIRE_GRACE
+from bot.scheduler.jobs import send_daily_digest, is_reminder_time_passed
+
+DAILY_DIGEST_JOB_ID = "daily_digest"
+LEADER_LEASE_NAME = "scheduler"
+TIMEZONE = "Europe/Moscow"
+
+
+def create_scheduler(db_path: str = SCHEDULER_DB_PATH) -> AsyncIOScheduler:
+    """
+    Планировщик с постоянным хранилищем задач.
+
+    Задачи и время их следующего запуска переживают перезапуск. Запуск, пропущенный
+    из-за простоя, выполняется один раз (coalesce), если опоздание не больше
+    SCHEDULER_MISFIRE_GRACE. Разовые служебные задачи живут только в памяти.
+    """
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    return AsyncIOScheduler(
+        timezone=TIMEZONE,
+        jobstores={
+            "default": SQLAlchemyJobStore(url=f"sqlite:///{db_path}"),
+            "memory": MemoryJobStore(),
+        },
+        job_defaults={
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": SCHEDULER_MISFIRE_GRACE,
+        },
+    )
+
+
+def schedule_jobs(scheduler: AsyncIOScheduler):
+    """
+    Регистрирует задачи. Вызывать после scheduler.start(paused=True): сохранённая задача
+    остаётся как есть — вместе с пропущенным временем запуска, которое нужно догнать.
+    """
+    trigger = CronTrigger(hour=REMINDER_HOUR, minute=0, timezone=TIMEZONE)
+    job = scheduler.get_job(DAILY_DIGEST_JOB_ID)
+    if job is None:
+        scheduler.add_job(send_daily_digest, trigger, id=DAILY_DIGEST_JOB_ID)
+    elif str(job.trigger) != str(trigger):
+        # Поменяли REMINDER_HOUR — переносим задачу на новое время
+        scheduler.reschedule_job(DAILY_DIGEST_JOB_ID, trigger=trigger)
+
+    # Простой дольше SCHEDULER_MISFIRE_GRACE или первый запуск: догоняем сегодняшнюю сводку.
+    # Журнал напоминаний не даст отправить уже отправленное.
+    if is_reminder_time_passed(REMINDER_HOUR):
+        scheduler.add_job(send_daily_digest, jobstore="memory")
+
+
+def start_scheduler(scheduler: AsyncIOScheduler):
+    """Запускает задачи в этом процессе. Вызывается, когда процесс стал лидером."""
+    if not scheduler.running:
+        scheduler.start(paused=True)
+    schedule_jobs(scheduler)
+    scheduler.resume()
+
+
+def pause_scheduler(scheduler: AsyncIOScheduler):
+    """Лидерство потеряно: задачи больше не запускаются здесь (их выполнит новый лидер)."""
+    if scheduler.running:
+        scheduler.pause()
+
+
+def stop_scheduler(scheduler: AsyncIOScheduler):
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
@@ -1,4 +1,5 @@
 # bot/services/__init__.py
-
-from .finance_service import FinanceService
-from .export_service import ExportService
\ No newline at end of file
+# Сервисы импортируются по полному пути (bot.services.finance_service и т.д.).
+# Здесь ничего не импортируем: процессы пула экспорта загружают только
+# bot.services.xlsx_writer / excel_builder, и импорт пакета не должен тянуть за
+# собой конфиг, движки БД, файловый логгер и кэш экспорта родительского процесса.
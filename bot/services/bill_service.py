@@ -3,15 +3,15 @@ from datetime import datetime, timedelta, date
 from dateutil.relativedelta import relativedelta
 
 from bot.database.repository import UserRepository, BillRepository, DebtRepository
-from bot.database.session import get_session
+from bot.database.session import session_scope
 from bot.database.models import Bill
 
 class BillService:
     @staticmethod
     async def add_bill(telegram_id: int, description: str, amount: float, due_date: datetime, debt_id: int = None):
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             if not user:
                 return {"success": False, "error": "Пользователь не найден"}
 
@@ -36,9 +36,9 @@ class BillService:
 
     @staticmethod
     async def get_active_bills(telegram_id: int):
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             if not user:
                 return []
             bill_repo = BillRepository(session)
@@ -46,9 +46,9 @@ class BillService:
 
     @staticmethod
     async def pay_bill(telegram_id: int, bill_id: int):
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             if not user:
                 return {"success": False, "error": "Пользователь не найден"}
 
@@ -74,11 +74,11 @@ class BillService:
         if installments < 1:
             return {"success": False, "error": "Количество платежей должно быть ≥ 1"}
 
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
             debt_repo = DebtRepository(session)
 
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             debt = await debt_repo.get_debt_by_id(debt_id)
             if not user or not debt or debt.user_id != user.id:
                 return {"success": False, "error": "Долг не найден"}
@@ -103,7 +103,7 @@ class BillService:
                 current_installment=1
             )
             session.add(bill)
-            await session.commit()
+            await session.flush()
             return {
                 "success": True,
                 "amount_per_payment": amount_per_payment,
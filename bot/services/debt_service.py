@@ -1,7 +1,7 @@
 # services/debt_service.py
 
 from bot.database.repository import UserRepository, DebtRepository, DebtPaymentRepository
-from bot.database.session import get_session
+from bot.database.session import session_scope
 from datetime import datetime
 
 class DebtService:
@@ -14,11 +14,11 @@ class DebtService:
             category: str,
             note: str = None
     ):
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
             debt_repo = DebtRepository(session)
 
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             if not user:
                 return {"success": False, "error": "Пользователь не найден"}
 
@@ -34,11 +34,11 @@ class DebtService:
 
     @staticmethod
     async def get_active_debts(telegram_id: int):
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
             debt_repo = DebtRepository(session)
 
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             if not user:
                 return []
 
@@ -47,11 +47,11 @@ class DebtService:
 
     @staticmethod
     async def record_payment(telegram_id: int, debt_id: int, amount: float):
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
             debt_repo = DebtRepository(session)
 
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             if not user:
                 return {"success": False, "error": "Пользователь не найден"}
 
@@ -67,39 +67,39 @@ class DebtService:
 
     @staticmethod
     async def get_debt_statistics(telegram_id: int):
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
             debt_repo = DebtRepository(session)
 
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             if not user:
                 return {}
             return await debt_repo.get_debt_statistics(user.id)
 
     @staticmethod
     async def get_debts_with_status(telegram_id: int):
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
             debt_repo = DebtRepository(session)
 
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             if not user:
                 return []
             return await debt_repo.get_debts_with_status(user.id)
 
     @staticmethod
     async def get_debt_by_id(debt_id: int):
-        async for session in get_session():
+        async with session_scope() as session:
             debt_repo = DebtRepository(session)
             return await debt_repo.get_debt_by_id(debt_id)
 
     @staticmethod
     async def get_unlinked_active_debts(telegram_id: int):
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
             debt_repo = DebtRepository(session)
 
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             if not user:
                 return []
             return await debt_repo.get_unlinked_active_debts_by_user(user.id)
@@ -107,7 +107,7 @@ class DebtService:
     @staticmethod
     async def update_debt(debt_id: int, description: str, total_amount: float, due_date, category: str,
                           note: str = None):
-        async for session in get_session():
+        async with session_scope() as session:
             debt_repo = DebtRepository(session)
             debt = await debt_repo.get_debt_by_id(debt_id)
             if not debt:
@@ -124,13 +124,13 @@ class DebtService:
             if total_amount < debt.remaining_amount:
                 debt.remaining_amount = total_amount
 
-            await session.commit()
+            await session.flush()
             return {"success": True}
 
     @staticmethod
     async def close_debt(debt_id: int):
         """Помечает долг как закрытый (остаток = 0)."""
-        async for session in get_session():
+        async with session_scope() as session:
             debt_repo = DebtRepository(session)
             debt = await debt_repo.get_debt_by_id(debt_id)
             if not debt or not debt.is_active:
@@ -138,13 +138,13 @@ class DebtService:
 
             debt.remaining_amount = 0
             debt.is_active = False
-            await session.commit()
+            await session.flush()
             return {"success": True}
 
     @staticmethod
     async def delete_debt(debt_id: int):
         """Удаляет долг, только если по нему не было платежей."""
-        async for session in get_session():
+        async with session_scope() as session:
             # Проверяем, были ли платежи
             payment_repo = DebtPaymentRepository(session)
             payments = await payment_repo.get_payments_by_debt(debt_id)
@@ -157,18 +157,18 @@ class DebtService:
                 return {"success": False, "error": "Долг не найден"}
 
             await session.delete(debt)
-            await session.commit()
+            await session.flush()
             return {"success": True}
 
     @staticmethod
     async def create_debt_with_schedule(telegram_id: int, description: str, total_amount: float, due_date,
                                         category: str, note: str, months: int):
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
             debt_repo = DebtRepository(session)
             schedule_repo = PaymentScheduleRepository(session)
 
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             debt = Debt(
                 user_id=user.id,
                 telegram_id=telegram_id,
@@ -185,6 +185,6 @@ class DebtService:
             # Сразу создаём график
             await schedule_repo.create_schedule(debt.id, months)
 
-            await session.commit()
+            await session.flush()
             await session.refresh(debt)
             return {"success": True, "debt_id": debt.id}
\ No newline at end of file
@@ -0,0 +1,27 @@
+# services/excel_builder.py
+"""
+Сборка Excel-отчёта через pandas (бэкенд EXPORT_BACKEND=pandas).
+
+Функции модуля синхронные и получают только данные, которые можно передать в
+другой процесс (SheetSpool), поэтому выполняются в пуле экспорта, не блокируя
+event loop. Основной бэкенд — потоковый, см. services/xlsx_writer.py.
+"""
+from io import BytesIO
+
+import pandas as pd
+
+
+def build_workbook(spools: list) -> bytes:
+    """Собирает книгу из спулов листов. Листы без строк пропускаются."""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        for spool in spools:
+            if not spool.row_count:
+                continue
+            df = pd.DataFrame(list(spool.rows()), columns=spool.columns)
+            df.to_excel(writer, index=False, sheet_name=spool.title)
+
+            worksheet = writer.sheets[spool.title]
+            for i, width in enumerate(spool.column_widths()):
+                worksheet.column_dimensions[worksheet.cell(row=1, column=i + 1).column_letter].width = width
+    return output.getvalue()
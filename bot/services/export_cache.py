@@ -0,0 +1,134 @@
+# services/export_cache.py
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from bot.config import EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES, EXPORT_CACHE_MAX_ENTRIES
+
+
+class ExportCache:
+    """
+    Кэш готовых xlsx-файлов.
+
+    Файлы лежат на диске (``<digest>.xlsx`` + ``<digest>.json`` с метаданными),
+    индекс — в памяти в порядке LRU. Ключ включает версию данных пользователя,
+    поэтому после любого изменения данных старые записи просто перестают
+    запрашиваться и со временем вытесняются.
+
+    Индекс не знает о чужих изменениях каталога, поэтому у каждого процесса
+    свой каталог (см. relocate); пропавший файл считается промахом.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.relocate(directory)
+
+    def relocate(self, directory: str):
+        """Переключает кэш на другой каталог и восстанавливает индекс по его файлам."""
+        self.directory = directory
+        self._index: "OrderedDict[str, dict]" = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+
+    def _paths(self, digest: str) -> tuple[str, str]:
+        base = os.path.join(self.directory, digest)
+        return base + ".xlsx", base + ".json"
+
+    def _load_index(self):
+        """Восстанавливает индекс по файлам, оставшимся от прошлого запуска (старые — первыми)."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            digest = name[:-len(".json")]
+            content_path, meta_path = self._paths(digest)
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                entries.append((os.path.getmtime(content_path), digest, meta))
+            except (OSError, ValueError):
+                self._remove_files(digest)
+
+        for _, digest, meta in sorted(entries, key=lambda e: e[0]):
+            self._index[digest] = meta
+            self._total_bytes += meta["size"]
+        self._evict()
+
+    def _remove_files(self, digest: str):
+        for path in self._paths(digest):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        while self._index and (len(self._index) > self.max_entries or self._total_bytes > self.max_bytes):
+            digest, meta = self._index.popitem(last=False)
+            self._total_bytes -= meta["size"]
+            self._remove_files(digest)
+
+    def _read(self, digest: str) -> bytes:
+        with open(self._paths(digest)[0], "rb") as f:
+            return f.read()
+
+    def _write(self, digest: str, content: bytes, meta: dict):
+        # Через временный файл: при сбое посреди записи не останется обрезанного xlsx
+        content_path, meta_path = self._paths(digest)
+        with open(content_path + ".tmp", "wb") as f:
+            f.write(content)
+        os.replace(content_path + ".tmp", content_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    async def get(self, key: str) -> tuple[bytes, str] | None:
+        meta = self._index.get(key)
+        if meta is None:
+            self.misses += 1
+            return None
+        try:
+            content = await asyncio.to_thread(self._read, key)
+        except OSError:
+            # Файл удалили снаружи — считаем промахом
+            self._index.pop(key, None)
+            self._total_bytes -= meta["size"]
+            self.misses += 1
+            return None
+
+        self._index.move_to_end(key)
+        self.hits += 1
+        return content, meta["filename"]
+
+    async def put(self, key: str, content: bytes, filename: str):
+        if len(content) > self.max_bytes:
+            return
+        meta = {"filename": filename, "size": len(content)}
+        await asyncio.to_thread(self._write, key, content, meta)
+
+        previous = self._index.pop(key, None)
+        if previous is not None:
+            self._total_bytes -= previous["size"]
+        self._index[key] = meta
+        self._total_bytes += meta["size"]
+        self._evict()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+export_cache = ExportCache(EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES, EXPORT_CACHE_MAX_ENTRIES)
@@ -0,0 +1,49 @@
+# services/export_pool.py
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from bot.config import EXPORT_EXECUTOR, EXPORT_MAX_WORKERS, EXPORT_CONCURRENCY
+
+
+class ExportPool:
+    """
+    Пул для тяжёлой синхронной работы экспорта (сборка xlsx).
+
+    Работа уходит из event loop в процессы (или потоки), а семафор ограничивает
+    число одновременных сборок — остальные запросы ждут своей очереди.
+    """
+
+    def __init__(self, kind: str = "process", max_workers: int = 2, concurrency: int = 2):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Неизвестный тип пула экспорта: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._executor: Executor | None = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn: не копируем в дочерний процесс потоки и соединения event loop
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="export")
+        return self._executor
+
+    async def run(self, func, *args):
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+export_pool = ExportPool(EXPORT_EXECUTOR, EXPORT_MAX_WORKERS, EXPORT_CONCURRENCY)
@@ -1,253 +1,233 @@
 # services/export_service.py
-import pandas as pd
+import asyncio
+from collections import namedtuple
 from io import BytesIO
 from datetime import datetime, timedelta
 import pytz
-from sqlalchemy import select
 
 from bot.database.repository import UserRepository, TransactionRepository, DebtRepository, DebtPaymentRepository, BillRepository
-from bot.database.repository import PaymentScheduleRepository
-from bot.database.session import get_session
-from bot.database.models import Debt
+from bot.database.repository import PaymentScheduleRepository, SentFileRepository
+from bot.config import EXPORT_BACKEND
+from bot.database.session import session_scope, read_session
+from bot.services.excel_builder import build_workbook
+from bot.services.export_cache import export_cache
+from bot.services.export_pool import export_pool
+from bot.services.xlsx_writer import SheetSpool, write_workbook
 
 
 MSK = pytz.timezone('Europe/Moscow')
 
+TRANSACTION_COLUMNS = ["Дата", "Тип", "Сумма (руб.)", "Описание"]
+DEBT_COLUMNS = ["ID", "Название", "Категория", "Примечание", "Полная сумма (руб.)", "Остаток (руб.)", "Дата погашения"]
+DEBT_PAYMENT_COLUMNS = ["Дата", "Долг", "Категория", "Сумма оплаты (руб.)"]
+PAID_BILL_COLUMNS = ["Дата оплаты", "Счёт", "Сумма оплаты (руб.)", "Связанный долг"]
+SCHEDULE_COLUMNS = ["Дата", "Сумма", "Статус", "Долг"]
+
+# Готовый отчёт. key — ключ для повторной отправки по file_id: пользователь, границы
+# периода, версия данных и имя файла. Байты xlsx для него не годятся — openpyxl пишет
+# в книгу время сборки. None, если листы могли попасть в разные снимки данных
+ExportFile = namedtuple("ExportFile", ["file", "filename", "key"])
+
+
 class ExportService:
     @staticmethod
-    async def export_transactions_to_excel(telegram_id: int, period: str) -> tuple[BytesIO, str] | None:
-        async for session in get_session():
-            user_repo = UserRepository(session)
-            trans_repo = TransactionRepository(session)
-            debt_repo = DebtRepository(session)
-            schedule_repo = PaymentScheduleRepository(session)
-
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
-            if not user:
+    async def export_transactions_to_excel(telegram_id: int, period: str) -> ExportFile | None:
+        spools = []
+        try:
+            async with session_scope() as session:
+                user = await UserRepository(session).get_cached_user(telegram_id)
+                if not user:
+                    return None
+
+            # Тот же пользователь, период, день и версия данных — отдаём готовый файл.
+            # Версия читается из тех же закоммиченных данных, что и листы
+            data_version = await ExportService._data_version(user.id)
+            start, end = TransactionRepository._get_period_bounds(period)
+            cache_key = export_cache.make_key(
+                user.id, period, start.isoformat(), end.isoformat(),
+                datetime.now(MSK).date().isoformat(), data_version
+            )
+            cached = await export_cache.get(cache_key)
+            if cached is not None:
+                content, filename = cached
+                return ExportFile(BytesIO(content), filename, ExportService._sent_file_key(user.id, start, end, data_version, filename))
+
+            # Листы собираются параллельно, каждый на своём соединении только для чтения:
+            # время ожидания — по самому медленному запросу, а не сумма всех.
+            # Строки идут из курсора БД прямо в спулы на диске — без списков и DataFrame
+            results = await asyncio.gather(
+                ExportService._collect(ExportService._spool_transactions, user.id, period),
+                ExportService._collect(ExportService._spool_debts, user.id),
+                ExportService._collect(ExportService._spool_debt_payments, user.id),
+                ExportService._collect(ExportService._spool_paid_bills, user.id),
+                ExportService._collect(ExportService._spool_schedules, user.id),
+                return_exceptions=True
+            )
+            spools.extend(r for r in results if isinstance(r, SheetSpool))
+            for r in results:
+                if isinstance(r, BaseException):
+                    raise r
+
+            if not any(spool.row_count for spool in spools):
                 return None
 
-            # === Сбор транзакций ===
-            transactions = await trans_repo.get_transactions_by_user_and_period(user.id, period)
-            df = pd.DataFrame()
-            total_income = total_expense = 0.0
-
-            if transactions:
-                data = []
-                for t in transactions:
-                    amount = float(t.amount)
-                    if t.type == "income":
-                        total_income += amount
-                    else:
-                        total_expense += amount
-                    data.append({
-                        "Дата": t.date.strftime("%d.%m.%Y %H:%M"),
-                        "Тип": "Доход" if t.type == "income" else "Расход",
-                        "Сумма (руб.)": amount,
-                        "Описание": t.description or "—"
-                    })
-                df = pd.DataFrame(data)
-                df = df.sort_values("Дата", ascending=False)
-
-            # === Итоги в виде отдельных строк ===
-            if not df.empty:
-                separator = pd.DataFrame([{"Дата": "", "Тип": "", "Сумма (руб.)": "", "Описание": ""}])
-                summary = pd.DataFrame([
-                    {"Дата": "Итоги:", "Тип": "Доходы", "Сумма (руб.)": total_income, "Описание": "руб."},
-                    {"Дата": "", "Тип": "Расходы", "Сумма (руб.)": total_expense, "Описание": "руб."},
-                    {"Дата": "", "Тип": "Баланс", "Сумма (руб.)": total_income - total_expense, "Описание": "руб."},
-                ])
-                final_df = pd.concat([df, separator, summary], ignore_index=True)
-            else:
-                final_df = pd.DataFrame(columns=["Дата", "Тип", "Сумма (руб.)", "Описание"])
-
-            # === Сбор оплат по долгам ===
-            debt_payment_repo = DebtPaymentRepository(session)
-            payments = await debt_payment_repo.get_payments_by_user(user.id)
-            payments_df = pd.DataFrame()
-
-            if payments:
-                payment_data = []
-                for p in payments:
-                    payment_data.append({
-                        "Дата": p["paid_at"].strftime("%d.%m.%Y %H:%M"),
-                        "Долг": p["description"],
-                        "Категория": p["category"],
-                        "Сумма оплаты (руб.)": float(p["amount"])
-                    })
-                payments_df = pd.DataFrame(payment_data)
-                payments_df = payments_df.sort_values("Дата", ascending=False)
-
-            # === Сбор долгов ===
-            debts = await debt_repo.get_active_debts_by_user(user.id)
-            debts_df = pd.DataFrame()
-            total_remaining = total_paid = 0.0
-
-            if debts:
-                debt_data = []
-                for d in debts:
-                    paid = float(d.total_amount - d.remaining_amount)
-                    total_remaining += float(d.remaining_amount)
-                    total_paid += paid
-                    debt_data.append({
-                        "ID": d.id,
-                        "Название": d.description,
-                        "Категория": d.category,
-                        "Примечание": d.note or "—",
-                        "Полная сумма (руб.)": float(d.total_amount),
-                        "Остаток (руб.)": float(d.remaining_amount),
-                        "Дата погашения": d.due_date.strftime("%d.%m.%Y")
-                    })
-                debts_df = pd.DataFrame(debt_data)
-
-            # === Оплаченные счета ===
-            bill_repo = BillRepository(session)
-            paid_bills = await bill_repo.get_paid_bills_by_user(user.id)
-            paid_bills_df = pd.DataFrame()
-            if paid_bills:
-                bill_data = []
-                for row in paid_bills:
-                    bill = row[0]  # Bill объект
-                    debt_desc = row[1]  # debt_description (может быть None)
-                    bill_data.append({
-                        "Дата оплаты": bill.paid_at.strftime("%d.%m.%Y %H:%M"),
-                        "Счёт": bill.description,
-                        "Сумма оплаты (руб.)": float(bill.amount),
-                        "Связанный долг": debt_desc or "—"
-                    })
-                paid_bills_df = pd.DataFrame(bill_data)
-
-            # === Имя файла ===
-            now = datetime.now(MSK)
-            if period == "day":
-                date_str = now.strftime("%d.%m.%Y")
-                filename = f"Отчёт_за_{date_str}.xlsx"
-            elif period == "week":
-                start = now - timedelta(days=now.weekday())
-                date_str = f"{start.strftime('%d.%m.%Y')}-{now.strftime('%d.%m.%Y')}"
-                filename = f"Отчёт_за_неделю_{date_str}.xlsx"
-            elif period == "month":
-                date_str = now.strftime("%m.%Y")
-                filename = f"Отчёт_за_месяц_{date_str}.xlsx"
-            elif period == "year":
-                date_str = str(now.year)
-                filename = f"Отчёт_за_год_{date_str}.xlsx"
+            # Сборка xlsx — тяжёлая синхронная работа, выполняем её вне event loop
+            build = write_workbook if EXPORT_BACKEND == "streaming" else build_workbook
+            content = await export_pool.run(build, spools)
+            filename = ExportService._filename(period)
+            # Листы читаются на разных соединениях: если между чтениями прошла запись,
+            # они могли попасть в разные снимки — такой файл отдаём, но не кэшируем
+            if await ExportService._data_version(user.id) != data_version:
+                return ExportFile(BytesIO(content), filename, None)
+            await export_cache.put(cache_key, content, filename)
+            return ExportFile(BytesIO(content), filename, ExportService._sent_file_key(user.id, start, end, data_version, filename))
+        finally:
+            for spool in spools:
+                spool.discard()
+
+    @staticmethod
+    async def _data_version(user_id: int) -> int:
+        async with read_session() as session:
+            return await UserRepository(session).get_data_version(user_id)
+
+    @staticmethod
+    def _sent_file_key(user_id: int, start, end, data_version: int, filename: str) -> str:
+        # Имя входит в ключ: оно приходит вместе с file_id
+        return export_cache.make_key(user_id, start.isoformat(), end.isoformat(), data_version, filename)
+
+    @staticmethod
+    async def _collect(spool_rows, *args) -> SheetSpool:
+        async with read_session() as session:
+            return await spool_rows(session, *args)
+
+    @staticmethod
+    async def get_sent_file_id(key: str) -> str | None:
+        """file_id уже отправленного отчёта с тем же ключом (см. ExportFile)."""
+        async with session_scope() as session:
+            return await SentFileRepository(session).get_file_id(key)
+
+    @staticmethod
+    async def remember_sent_file(key: str, file_id: str):
+        async with session_scope() as session:
+            await SentFileRepository(session).save_file_id(key, file_id)
+
+    @staticmethod
+    async def forget_sent_file(key: str):
+        async with session_scope() as session:
+            await SentFileRepository(session).forget(key)
+
+    @staticmethod
+    async def _spool_transactions(session, user_id: int, period: str) -> SheetSpool:
+        spool = SheetSpool("Транзакции", TRANSACTION_COLUMNS)
+        result = await TransactionRepository(session).stream_period_rows(user_id, period)
+
+        total_income = total_expense = 0.0
+        async for tx_date, tx_type, amount, description in result:
+            amount = float(amount)
+            if tx_type == "income":
+                total_income += amount
             else:
-                filename = "Отчёт.xlsx"
-
-            # === Запись в Excel ===
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                # Лист: Транзакции
-                if not final_df.empty:
-                    final_df.to_excel(writer, index=False, sheet_name="Транзакции")
-                    worksheet = writer.sheets["Транзакции"]
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        worksheet.column_dimensions[column_letter].width = adjusted_width
-
-                # Лист: Долги
-                if not debts_df.empty:
-                    debts_df.to_excel(writer, index=False, sheet_name="Долги")
-                    worksheet = writer.sheets["Долги"]
-                    last_row = len(debts_df) + 2
-                    worksheet.cell(row=last_row, column=4, value="ИТОГО:")
-                    worksheet.cell(row=last_row, column=5, value="Остаток по долгам:")
-                    worksheet.cell(row=last_row, column=6, value=total_remaining)
-                    worksheet.cell(row=last_row + 1, column=5, value="Уже выплачено:")
-                    worksheet.cell(row=last_row + 1, column=6, value=total_paid)
-
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        worksheet.column_dimensions[column_letter].width = adjusted_width
-
-                # Лист: Оплаты по долгам
-                if not payments_df.empty:
-                    payments_df.to_excel(writer, index=False, sheet_name="Оплаты по долгам")
-                    worksheet = writer.sheets["Оплаты по долгам"]
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        worksheet.column_dimensions[column_letter].width = adjusted_width
-
-                # Лист 3: Оплаты по счетам
-                if not paid_bills_df.empty:
-                    paid_bills_df.to_excel(writer, index=False, sheet_name="Оплаты по счетам")
-                    worksheet = writer.sheets["Оплаты по счетам"]
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        worksheet.column_dimensions[column_letter].width = adjusted_width
-
-                # === График платежей ===
-                schedules = await schedule_repo.get_schedules_by_user(user.id)
-                schedules_df = pd.DataFrame()
-
-                if schedules:
-                    schedule_data = []
-                    for row in schedules:
-                        # row[0] — это объект PaymentSchedule
-                        # row.debt_description — это описание долга
-                        s = row[0]
-                        debt_desc = row.debt_description or "—"
-                        schedule_data.append({
-                            "Дата": s.due_date.strftime("%d.%m.%Y"),
-                            "Сумma": float(s.amount),
-                            "Статус": "Оплачен" if s.is_paid else "Ожидает",
-                            "Долг": debt_desc
-                        })
-                    schedules_df = pd.DataFrame(schedule_data)
-
-                    # Добавляем лист в Excel
-                    schedules_df.to_excel(writer, index=False, sheet_name="График платежей")
-                    worksheet = writer.sheets["График платежей"]
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        worksheet.column_dimensions[column_letter].width = adjusted_width
-
-            if not paid_bills_df.empty:
-                paid_bills_df.to_excel(writer, index=False, sheet_name="Оплаты по счетам")
-            output.seek(0)
-            return output, filename
-
-    async def get_active_debts_by_user(self, user_id: int):
-        stmt = select(Debt).where(Debt.user_id == user_id, Debt.is_active == True)
-        result = await self.session.execute(stmt)
-        return result.scalars().all()
\ No newline at end of file
+                total_expense += amount
+            spool.append((
+                tx_date.strftime("%d.%m.%Y %H:%M"),
+                "Доход" if tx_type == "income" else "Расход",
+                amount,
+                description or "—"
+            ))
+
+        # === Итоги в виде отдельных строк ===
+        if spool.row_count:
+            spool.append(("", "", "", ""))
+            spool.append(("Итоги:", "Доходы", total_income, "руб."))
+            spool.append(("", "Расходы", total_expense, "руб."))
+            spool.append(("", "Баланс", total_income - total_expense, "руб."))
+
+        spool.close()
+        return spool
+
+    @staticmethod
+    async def _spool_debts(session, user_id: int) -> SheetSpool:
+        spool = SheetSpool("Долги", DEBT_COLUMNS)
+        result = await DebtRepository(session).stream_active_debt_rows(user_id)
+
+        total_remaining = total_paid = 0.0
+        async for debt_id, description, category, note, total_amount, remaining_amount, due_date in result:
+            total_remaining += float(remaining_amount)
+            total_paid += float(total_amount - remaining_amount)
+            spool.append((
+                debt_id,
+                description,
+                category,
+                note or "—",
+                float(total_amount),
+                float(remaining_amount),
+                due_date.strftime("%d.%m.%Y")
+            ))
+
+        # === Итоги под таблицей (колонки 4–6) ===
+        if spool.row_count:
+            spool.append((None, None, None, "ИТОГО:", "Остаток по долгам:", total_remaining, None))
+            spool.append((None, None, None, None, "Уже выплачено:", total_paid, None))
+
+        spool.close()
+        return spool
+
+    @staticmethod
+    async def _spool_debt_payments(session, user_id: int) -> SheetSpool:
+        spool = SheetSpool("Оплаты по долгам", DEBT_PAYMENT_COLUMNS)
+        result = await DebtPaymentRepository(session).stream_payments_by_user(user_id)  # уже по убыванию даты
+        async for paid_at, amount, description, category in result:
+            spool.append((paid_at.strftime("%d.%m.%Y %H:%M"), description, category, float(amount)))
+        spool.close()
+        return spool
+
+    @staticmethod
+    async def _spool_paid_bills(session, user_id: int) -> SheetSpool:
+        spool = SheetSpool("Оплаты по счетам", PAID_BILL_COLUMNS)
+        result = await BillRepository(session).stream_paid_bill_rows(user_id)
+        async for paid_at, description, amount, debt_description in result:
+            spool.append((
+                paid_at.strftime("%d.%m.%Y %H:%M"),
+                description,
+                float(amount),
+                debt_description or "—"
+            ))
+        spool.close()
+        return spool
+
+    @staticmethod
+    async def _spool_schedules(session, user_id: int) -> SheetSpool:
+        spool = SheetSpool("График платежей", SCHEDULE_COLUMNS)
+        result = await PaymentScheduleRepository(session).stream_schedule_rows(user_id)
+        async for due_date, amount, is_paid, debt_description in result:
+            spool.append((
+                due_date.strftime("%d.%m.%Y"),
+                float(amount),
+                "Оплачен" if is_paid else "Ожидает",
+                debt_description or "—"
+            ))
+        spool.close()
+        return spool
+
+    @staticmethod
+    def _filename(period: str) -> str:
+        now = datetime.now(MSK)
+        if period == "day":
+            date_str = now.strftime("%d.%m.%Y")
+            return f"Отчёт_за_{date_str}.xlsx"
+        elif period == "week":
+            start = now - timedelta(days=now.weekday())
+            date_str = f"{start.strftime('%d.%m.%Y')}-{now.strftime('%d.%m.%Y')}"
+            return f"Отчёт_за_неделю_{date_str}.xlsx"
+        elif period == "month":
+            date_str = now.strftime("%m.%Y")
+            return f"Отчёт_за_месяц_{date_str}.xlsx"
+        elif period == "year":
+            date_str = str(now.year)
+            return f"Отчёт_за_год_{date_str}.xlsx"
+        try:
+            start, end = TransactionRepository._get_period_bounds(period)
+        except ValueError:
+            return "Отчёт.xlsx"
+        last = end - timedelta(days=1)
+        return f"Отчёт_за_{start.strftime('%d.%m.%Y')}-{last.strftime('%d.%m.%Y')}.xlsx"
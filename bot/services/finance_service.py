@@ -1,7 +1,8 @@
 # services/finance_service.py
 from typing import Optional
 from bot.database.repository import UserRepository, TransactionRepository
-from bot.database.session import get_session
+from bot.database.session import session_scope, savepoint
+from bot.utils.periods import current_period_bounds, previous_bounds, period_title, make_range_period
 
 from datetime import datetime, timedelta
 import pytz
@@ -18,29 +19,32 @@ class FinanceService:
         transaction_type: str,  # "income" или "expense"
         description: Optional[str] = None
     ) -> dict:
-        async for session in get_session():
+        async with session_scope() as session:
             try:
-                user_repo = UserRepository(session)
-                transaction_repo = TransactionRepository(session)
-
-                user = await user_repo.get_or_create_user(
-                    telegram_id=telegram_id,
-                    username=username,
-                    full_name=full_name
-                )
-
-                await transaction_repo.add_transaction(
-                    user_id=user.id,
-                    type=transaction_type,
-                    amount=amount,
-                    description=description
-                )
-
-                await session.commit()
+                # Ошибка откатывает только эту операцию, а не всю работу апдейта
+                async with savepoint(session):
+                    user_repo = UserRepository(session)
+                    transaction_repo = TransactionRepository(session)
+
+                    # Обычно пользователь уже в кэше — без лишнего SELECT
+                    user = await user_repo.get_cached_user(telegram_id)
+                    if user is None:
+                        user = await user_repo.get_or_create_user(
+                            telegram_id=telegram_id,
+                            username=username,
+                            full_name=full_name
+                        )
+
+                    await transaction_repo.add_transaction(
+                        user_id=user.id,
+                        type=transaction_type,
+                        amount=amount,
+                        description=description
+                    )
+
                 return {"success": True, "user_id": user.id}
 
             except Exception as e:
-                await session.rollback()
                 return {"success": False, "error": str(e)}
 
     # Удобные обёртки (опционально)
@@ -55,41 +59,39 @@ class FinanceService:
     @staticmethod
     async def get_balance_report(telegram_id: int, period: str) -> dict:
         """Возвращает отчёт: доходы, расходы, баланс, кол-во операций за период."""
-        async for session in get_session():
+        async with session_scope() as session:
             user_repo = UserRepository(session)
             trans_repo = TransactionRepository(session)
 
-            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            user = await user_repo.get_cached_user(telegram_id)
             if not user:
                 return {"error": "Пользователь не найден"}
 
-            transactions = await trans_repo.get_transactions_by_user_and_period(user.id, period)
+            # Агрегаты считает SQLite — ORM-объекты транзакций не загружаются
+            start, end = current_period_bounds(period)
+            totals = await trans_repo.get_range_totals(user.id, start, end)
 
-            income = sum(t.amount for t in transactions if t.type == "income")
-            expense = sum(t.amount for t in transactions if t.type == "expense")
+            income = totals["income"]
+            expense = totals["expense"]
             balance = income - expense
-            count = len(transactions)
-
-            # Формируем заголовок отчёта
-            now = datetime.now(MSK)
-            if period == "day":
-                title_date = now.strftime("%d.%m.%Y")
-            elif period == "week":
-                start = now - timedelta(days=now.weekday())
-                title_date = f"{start.strftime('%d.%m.%Y')} – {now.strftime('%d.%m.%Y')}"
-            elif period == "month":
-                title_date = now.strftime("%B %Y")
-            elif period == "year":
-                title_date = str(now.year)
-            else:
-                title_date = "период"
+            count = totals["count"]
+
+            # Предыдущий период той же длины — для сравнения "месяц к месяцу"
+            prev_start, prev_end = previous_bounds(start, end)
+            previous = await trans_repo.get_range_totals(user.id, prev_start, prev_end)
 
             return {
                 "success": True,
-                "title": title_date,
+                "title": period_title(period),
                 "income": income,
                 "expense": expense,
                 "balance": balance,
+                "previous": {
+                    "title": period_title(make_range_period(prev_start.date(), prev_end.date() - timedelta(days=1))),
+                    "income": previous["income"],
+                    "expense": previous["expense"],
+                    "balance": previous["income"] - previous["expense"],
+                },
                 "count": count
             }
 
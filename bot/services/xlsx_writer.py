@@ -0,0 +1,89 @@
+# services/xlsx_writer.py
+"""
+Потоковая запись xlsx без pandas.
+
+Строки листа копятся в SheetSpool — временном файле на диске, — а ширины колонок
+считаются по ходу добавления строк. Затем write_workbook переписывает их в книгу
+openpyxl в режиме write_only. В памяти одновременно держится одна строка, поэтому
+расход памяти не зависит от длины истории.
+
+В write_only-режиме ширины колонок нужно задать до первой строки листа — поэтому
+строки сначала проходят через спул, а не пишутся в книгу напрямую.
+"""
+import os
+import pickle
+import tempfile
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+MAX_COLUMN_WIDTH = 50
+
+
+class SheetSpool:
+    """Буфер строк одного листа на диске. После close() объект можно передать в другой процесс."""
+
+    def __init__(self, title: str, columns: list, spool_dir: str = None):
+        self.title = title
+        self.columns = list(columns)
+        self.widths = [len(str(c)) for c in self.columns]
+        self.row_count = 0
+        fd, self.path = tempfile.mkstemp(prefix="export-", suffix=".rows", dir=spool_dir)
+        self._file = os.fdopen(fd, "wb")
+
+    def append(self, row: tuple):
+        for i, value in enumerate(row):
+            if value is not None:
+                length = len(str(value))
+                if length > self.widths[i]:
+                    self.widths[i] = length
+        pickle.dump(row, self._file, pickle.HIGHEST_PROTOCOL)
+        self.row_count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def rows(self):
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def column_widths(self) -> list:
+        return [min(w + 2, MAX_COLUMN_WIDTH) for w in self.widths]
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __getstate__(self):
+        # Открытый файл не передаётся между процессами — только путь к данным
+        state = self.__dict__.copy()
+        state["_file"] = None
+        return state
+
+
+def write_workbook(spools: list) -> bytes:
+    """Собирает книгу из спулов (листы без строк пропускаются)."""
+    workbook = Workbook(write_only=True)
+    for spool in spools:
+        if not spool.row_count:
+            continue
+        worksheet = workbook.create_sheet(spool.title)
+        for i, width in enumerate(spool.column_widths(), start=1):
+            worksheet.column_dimensions[get_column_letter(i)].width = width
+        worksheet.append(spool.columns)
+        for row in spool.rows():
+            worksheet.append(row)
+
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
@@ -0,0 +1,298 @@
+# bot/supervisor.py
+"""
+Несколько процессов-обработчиков за одним получателем апдейтов.
+
+    python -m bot.supervisor
+
+Супервизор — единственный, кто получает апдейты от Telegram (polling или webhook:
+getUpdates нельзя читать из нескольких процессов). Каждый апдейт уходит в очередь
+процесса chat_id % WORKERS, поэтому все апдейты одного чата обрабатывает один и тот
+же процесс — его кэш FSM остаётся верным. Процессы делят БД и хранилище FSM,
+планировщик запускает только один из них (аренда лидера в БД).
+
+SIGINT/SIGTERM: супервизор перестаёт принимать апдейты, отправляет каждому процессу
+сигнал остановки через его очередь и ждёт, пока тот доработает начатые апдейты.
+"""
+import asyncio
+import multiprocessing
+import os
+import queue as queue_module
+import secrets
+import signal
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError, TelegramRetryAfter
+from aiohttp import web
+
+from bot.config import (
+    BOT_TOKEN,
+    BOT_MODE,
+    EXPORT_CACHE_DIR,
+    HANDLER_CONCURRENCY,
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WORKERS,
+    WORKER_QUEUE_SIZE,
+    WORKER_SHUTDOWN_TIMEOUT,
+)
+from bot.logger import logger
+
+POLLING_TIMEOUT = 30
+# Как часто обработчик, ожидая апдейт, проверяет, жив ли супервизор
+QUEUE_POLL_INTERVAL = 1.0
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def chat_id_of(update: dict) -> int:
+    """chat_id апдейта (для апдейтов без чата — id пользователя, иначе 0)."""
+    for name, payload in update.items():
+        if name == "update_id" or not isinstance(payload, dict):
+            continue
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = payload.get("from") or payload.get("user")
+        if user:
+            return user["id"]
+    return 0
+
+
+def worker_index(update: dict, workers: int) -> int:
+    return chat_id_of(update) % workers
+
+
+def queue_size(updates_queue) -> int:
+    try:
+        return updates_queue.qsize()
+    except NotImplementedError:
+        # macOS: у multiprocessing.Queue нет qsize — отчёты тогда не откладываются по очереди
+        return 0
+
+
+# === Процесс-обработчик ===
+
+async def consume_updates(
+    dp,
+    bot: Bot,
+    updates_queue,
+    shutdown_timeout: float = WORKER_SHUTDOWN_TIMEOUT,
+    max_in_flight: int = HANDLER_CONCURRENCY,
+    is_supervisor_alive: Callable[[], bool] = lambda: True,
+):
+    """
+    Обрабатывает апдейты из очереди до None, затем дожидается начатых.
+
+    В работе не больше max_in_flight апдейтов: пока они не закончатся, следующий
+    из очереди не берётся — очередь заполняется, и супервизор притормаживает приём.
+    """
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Semaphore(max_in_flight)
+    tasks = set()
+
+    async def handle(raw: dict):
+        try:
+            await dp.feed_raw_update(bot, raw)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке апдейта {raw.get('update_id')}: {e}", exc_info=True)
+        finally:
+            in_flight.release()
+
+    def next_update():
+        while True:
+            try:
+                return updates_queue.get(timeout=QUEUE_POLL_INTERVAL)
+            except queue_module.Empty:
+                # Супервизор убит без остановки — сигнала через очередь не будет
+                if not is_supervisor_alive():
+                    return None
+
+    while True:
+        await in_flight.acquire()
+        raw = await loop.run_in_executor(None, next_update)
+        if raw is None:
+            in_flight.release()
+            break
+        task = asyncio.create_task(handle(raw))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.wait(tasks, timeout=shutdown_timeout)
+
+
+async def run_worker(index: int, updates_queue):
+    from bot.main import create_bot, create_dispatcher, bot_runtime
+    from bot.services.export_cache import export_cache
+
+    # Индекс кэша экспорта — в памяти процесса, поэтому и каталог у каждого свой.
+    # Чат всегда попадает в один процесс, так что общий каталог ничего бы не дал
+    export_cache.relocate(os.path.join(EXPORT_CACHE_DIR, f"worker-{index}"))
+    bot = create_bot()
+    # Ждущие апдейты — в очереди процесса: по ней и решаем, когда откладывать отчёты
+    dp = create_dispatcher(workers=WORKERS, backlog=lambda: queue_size(updates_queue))
+    async with bot_runtime(bot):
+        workflow_data = {"dispatcher": dp, "bot": bot, **dp.workflow_data}
+        await dp.emit_startup(**workflow_data)
+        logger.info(f"Процесс-обработчик {index} запущен")
+        try:
+            parent = multiprocessing.parent_process()
+            await consume_updates(dp, bot, updates_queue, is_supervisor_alive=parent.is_alive)
+        finally:
+            # Закрывает хранилище FSM — незаписанные состояния сохраняются в БД
+            await dp.emit_shutdown(**workflow_data)
+    logger.info(f"Процесс-обработчик {index} остановлен")
+
+
+def worker_main(index: int, updates_queue):
+    # Ctrl+C и SIGTERM (systemd) получает вся группа процессов; останавливает обработчики
+    # супервизор — через очередь, чтобы они успели доработать и сохранить состояния FSM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(run_worker(index, updates_queue))
+
+
+# === Супервизор ===
+
+class Supervisor:
+    def __init__(self, workers: int = WORKERS, queue_size: int = WORKER_QUEUE_SIZE):
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self.queues = [self._context.Queue(queue_size) for _ in range(workers)]
+        self.processes = [None] * workers
+        self.stopping = False
+
+    def start_worker(self, index: int):
+        # Не daemon: у обработчика есть свой пул процессов для сборки Excel
+        process = self._context.Process(target=worker_main, args=(index, self.queues[index]), name=f"bot-worker-{index}")
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(self.workers):
+            self.start_worker(index)
+
+    async def dispatch(self, raw: dict):
+        updates_queue = self.queues[worker_index(raw, self.workers)]
+        try:
+            updates_queue.put_nowait(raw)
+        except queue_module.Full:
+            # Процесс не успевает — ждём места, а с ним притормаживает и получение апдейтов
+            await asyncio.get_running_loop().run_in_executor(None, updates_queue.put, raw)
+
+    async def watch(self, interval: float = 1.0):
+        """Перезапускает упавшие процессы; их очередь с необработанными апдейтами сохраняется."""
+        while not self.stopping:
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive() and not self.stopping:
+                    logger.error(f"Процесс-обработчик {index} завершился с кодом {process.exitcode}, перезапускаем")
+                    self.start_worker(index)
+            await asyncio.sleep(interval)
+
+    async def stop(self, timeout: float = WORKER_SHUTDOWN_TIMEOUT):
+        self.stopping = True
+        loop = asyncio.get_running_loop()
+        stuck = set()
+        for index, updates_queue in enumerate(self.queues):
+            try:
+                await loop.run_in_executor(None, updates_queue.put, None, True, timeout)
+            except queue_module.Full:
+                # Очередь полна и не разбирается — процесс завис или мёртв
+                stuck.add(index)
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            if index not in stuck:
+                await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                # SIGTERM обработчики игнорируют — только SIGKILL
+                logger.warning(f"Процесс-обработчик {index} не завершился за {timeout} с, останавливаем принудительно")
+                process.kill()
+                await loop.run_in_executor(None, process.join)
+        for index in stuck:
+            # Не ждём при выходе, пока фоновый поток очереди допишет в неё апдейты
+            self.queues[index].cancel_join_thread()
+
+
+async def poll_updates(bot: Bot, supervisor: Supervisor):
+    await bot.delete_webhook()
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLLING_TIMEOUT, request_timeout=POLLING_TIMEOUT + 10)
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            continue
+        except (TelegramNetworkError, TelegramServerError) as e:
+            logger.warning(f"Ошибка получения апдейтов: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            await supervisor.dispatch(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+
+
+async def serve_webhook(bot: Bot, supervisor: Supervisor):
+    if not WEBHOOK_BASE_URL:
+        raise ValueError("Для BOT_MODE=webhook нужен WEBHOOK_BASE_URL")
+    secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+    async def handle(request: web.Request) -> web.Response:
+        if not secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=401)
+        await supervisor.dispatch(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    try:
+        await bot.set_webhook(url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH, secret_token=secret)
+        logger.info(f"Webhook супервизора запущен на {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_supervisor():
+    from bot.database import create_db_and_tables
+    from bot.database.session import engine
+
+    # Миграции — один раз до запуска обработчиков, а не в каждом из них
+    await create_db_and_tables()
+    await engine.dispose()
+
+    supervisor = Supervisor()
+    supervisor.start()
+    logger.info(f"Запущено процессов-обработчиков: {supervisor.workers}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    bot = Bot(token=BOT_TOKEN)
+    receive = serve_webhook if BOT_MODE == "webhook" else poll_updates
+    receiver = asyncio.create_task(receive(bot, supervisor))
+    watchdog = asyncio.create_task(supervisor.watch())
+    try:
+        await asyncio.wait([receiver, asyncio.create_task(stop.wait())], return_when=asyncio.FIRST_COMPLETED)
+        if receiver.done() and receiver.exception():
+            logger.error(f"Получение апдейтов остановилось: {receiver.exception()}")
+    finally:
+        logger.info("Останавливаем процессы-обработчики...")
+        receiver.cancel()
+        watchdog.cancel()
+        await asyncio.gather(receiver, watchdog, return_exceptions=True)
+        await supervisor.stop()
+        await bot.session.close()
+        logger.info("Бот остановлен.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_supervisor())
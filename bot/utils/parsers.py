@@ -0,0 +1,27 @@
+# bot/utils/parsers.py
+import re
+from datetime import datetime, date
+
+_DATE_RANGE_SEPARATOR = re.compile(r"\s*(?:-|–|—|по)\s*")
+
+
+def parse_date(text: str) -> date | None:
+    try:
+        return datetime.strptime(text.strip(), "%d.%m.%Y").date()
+    except ValueError:
+        return None
+
+
+def parse_date_range(text: str) -> tuple[date, date] | None:
+    """
+    Разбирает "ДД.ММ.ГГГГ - ДД.ММ.ГГГГ" (или одну дату) в пару дат, обе включительно.
+    Возвращает None, если формат неверный или начало позже конца.
+    """
+    parts = _DATE_RANGE_SEPARATOR.split(text.strip(), maxsplit=1)
+    dates = [parse_date(p) for p in parts]
+    if None in dates:
+        return None
+    start, end = dates[0], dates[-1]
+    if start > end:
+        return None
+    return start, end
@@ -0,0 +1,117 @@
+# bot/utils/periods.py
+"""
+Периоды отчётов.
+
+Период — строка, чтобы её можно было хранить в FSM и использовать в ключах кэша:
+  "day", "week", "month", "year"   — текущие окна (как раньше);
+  "prev_month", "quarter", "prev_quarter";
+  "range:2025-01-01:2025-03-31"    — произвольный диапазон, обе даты включительно.
+
+Границы — полуинтервал [start, end) в MSK, по нему строятся диапазонные выборки
+по индексу (user_id, date).
+"""
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+import pytz
+from dateutil.relativedelta import relativedelta
+
+MSK = pytz.timezone('Europe/Moscow')
+
+RANGE_PREFIX = "range:"
+
+MONTHS = [
+    "январь", "февраль", "март", "апрель", "май", "июнь",
+    "июль", "август", "сентябрь", "октябрь", "ноябрь", "декабрь"
+]
+
+
+def make_range_period(start: date, end: date) -> str:
+    """Период для диапазона дат (end включительно)."""
+    return f"{RANGE_PREFIX}{start.isoformat()}:{end.isoformat()}"
+
+
+def _msk_midnight(day: date) -> datetime:
+    return MSK.localize(datetime.combine(day, time.min))
+
+
+def _quarter_start(day: date) -> date:
+    return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+
+
+@lru_cache(maxsize=256)
+def period_bounds(period: str, today: date) -> tuple[datetime, datetime]:
+    """(start, end) периода относительно дня today. Кэшируется: день меняется раз в сутки."""
+    if period == "day":
+        start, end = today, today + timedelta(days=1)
+    elif period == "week":
+        start = today - timedelta(days=today.weekday())
+        end = start + timedelta(weeks=1)
+    elif period == "month":
+        start = today.replace(day=1)
+        end = start + relativedelta(months=1)
+    elif period == "prev_month":
+        end = today.replace(day=1)
+        start = end - relativedelta(months=1)
+    elif period == "quarter":
+        start = _quarter_start(today)
+        end = start + relativedelta(months=3)
+    elif period == "prev_quarter":
+        end = _quarter_start(today)
+        start = end - relativedelta(months=3)
+    elif period == "year":
+        start = today.replace(month=1, day=1)
+        end = start.replace(year=today.year + 1)
+    elif period.startswith(RANGE_PREFIX):
+        try:
+            first, last = (date.fromisoformat(p) for p in period[len(RANGE_PREFIX):].split(":"))
+        except ValueError:
+            raise ValueError("Неверный период")
+        if last < first:
+            raise ValueError("Неверный период")
+        start, end = first, last + timedelta(days=1)
+    else:
+        raise ValueError("Неверный период")
+    return _msk_midnight(start), _msk_midnight(end)
+
+
+def current_period_bounds(period: str) -> tuple[datetime, datetime]:
+    return period_bounds(period, datetime.now(MSK).date())
+
+
+def is_month_start(moment: datetime) -> bool:
+    return moment.day == 1 and moment.time() == time.min
+
+
+def previous_bounds(start: datetime, end: datetime) -> tuple[datetime, datetime]:
+    """
+    Предыдущий период той же длины: для целых месяцев — те же месяцы раньше
+    (март → февраль, квартал → прошлый квартал), иначе — столько же дней раньше.
+    """
+    if is_month_start(start) and is_month_start(end):
+        months = (end.year - start.year) * 12 + end.month - start.month
+        return _msk_midnight(start.date() - relativedelta(months=months)), start
+    return _msk_midnight(start.date() - (end.date() - start.date())), start
+
+
+def period_title(period: str, today: date = None) -> str:
+    """Человекочитаемое название периода для заголовка отчёта."""
+    today = today or datetime.now(MSK).date()
+    start, end = period_bounds(period, today)
+    first, last = start.date(), end.date() - timedelta(days=1)
+
+    if period == "day":
+        return today.strftime("%d.%m.%Y")
+    if period == "week":
+        return f"{first.strftime('%d.%m.%Y')} – {today.strftime('%d.%m.%Y')}"
+    if period == "year":
+        return str(today.year)
+    if is_month_start(start) and is_month_start(end):
+        months = (end.year - start.year) * 12 + end.month - start.month
+        if months == 1:
+            return f"{MONTHS[first.month - 1]} {first.year}"
+        if months == 3 and first.month % 3 == 1:
+            return f"{(first.month - 1) // 3 + 1} квартал {first.year}"
+    if first == last:
+        return first.strftime("%d.%m.%Y")
+    return f"{first.strftime('%d.%m.%Y')} – {last.strftime('%d.%m.%Y')}"
@@ -0,0 +1,55 @@
+# bot/utils/rate_limit.py
+import asyncio
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты «ведро токенов»: rate токенов в секунду, не больше capacity про запас.
+
+    acquire() ждёт, пока появится токен; try_acquire() не ждёт. pause() останавливает
+    выдачу токенов на заданное время — например, когда Telegram ответил RetryAfter.
+    Рассчитан на использование из одного event loop.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        now = self._clock()
+        if now < self._paused_until:
+            return False
+        self._refill(now)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1) -> float:
+        """Сколько секунд ждать до появления нужного числа токенов."""
+        now = self._clock()
+        self._refill(now)
+        wait = max(0.0, (tokens - self._tokens) / self.rate)
+        return max(wait, self._paused_until - now)
+
+    async def acquire(self, tokens: float = 1):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+    def pause(self, seconds: float):
+        """Не выдавать токены seconds секунд; запас токенов после паузы сбрасывается."""
+        now = self._clock()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
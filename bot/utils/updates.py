@@ -0,0 +1,19 @@
+# bot/utils/updates.py
+import time
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    """
+    Синтетический апдейт: текстовое сообщение в личном чате в том виде, в каком его
+    присылает Telegram. Нужен нагрузочному прогону webhook (bot.webhook_harness) и тестам.
+    """
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"},
+            "text": text,
+        },
+    }
@@ -0,0 +1,51 @@
+# bot/webhook.py
+"""
+Режим webhook: Telegram сам присылает апдейты POST-запросами на наш адрес.
+
+Каждый запрос проверяется по секретному токену (заголовок
+X-Telegram-Bot-Api-Secret-Token) и сразу получает ответ 200 — апдейт
+обрабатывается в фоне, а число одновременно обрабатываемых апдейтов
+ограничивает ConcurrencyLimitMiddleware.
+"""
+import asyncio
+import secrets
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from bot.config import WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT
+from bot.logger import logger
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, secret: str, path: str = WEBHOOK_PATH) -> web.Application:
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Поднимает HTTP-сервер, регистрирует webhook в Telegram и работает до отмены."""
+    if not WEBHOOK_BASE_URL:
+        raise ValueError("Для BOT_MODE=webhook нужен WEBHOOK_BASE_URL")
+
+    # Токен знают только Telegram и мы: чужие POST-запросы на адрес webhook отклоняются
+    secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    app = create_webhook_app(dp, bot, secret)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    try:
+        await bot.set_webhook(
+            url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=secret,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=True,
+        )
+        logger.info(f"Webhook запущен на {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,69 @@
+# bot/webhook_harness.py
+"""
+Локальная проверка webhook: отправляет на сервер синтетические апдейты так же,
+как это делает Telegram, и печатает статистику ответов.
+
+    python -m bot.webhook_harness --url http://127.0.0.1:8080/webhook --secret <WEBHOOK_SECRET> \\
+        --count 500 --concurrency 50 --chats 20 --text "📊 Отчёты"
+
+Апдейты обрабатываются по-настоящему (БД, хендлеры), но ответы боту уйдут
+на серверы Telegram — для нагрузочных прогонов используйте тестовый токен.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import aiohttp
+
+from bot.utils.updates import make_update
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+async def post_updates(url: str, secret: str, updates, concurrency: int = 10) -> dict:
+    """POST-ит апдейты с ограничением параллельности. Возвращает {статус: количество} и задержки."""
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: dict = {}
+    latencies = []
+
+    async with aiohttp.ClientSession(headers={SECRET_HEADER: secret}) as client:
+        async def post(update):
+            async with semaphore:
+                started = time.perf_counter()
+                async with client.post(url, json=update) as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        await asyncio.gather(*(post(update) for update in updates))
+
+    latencies.sort()
+    return {
+        "statuses": statuses,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0,
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические апдейты для webhook")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=10, help="сколько разных чатов (chat_id = 1..N)")
+    parser.add_argument("--text", default="/start")
+    args = parser.parse_args()
+
+    chat_ids = itertools.cycle(range(1, args.chats + 1))
+    updates = [make_update(i, next(chat_ids), args.text) for i in range(1, args.count + 1)]
+
+    started = time.perf_counter()
+    result = asyncio.run(post_updates(args.url, args.secret, updates, args.concurrency))
+    elapsed = time.perf_counter() - started
+    print(f"{args.count} апдейтов за {elapsed:.2f} с ({args.count / elapsed:.0f}/с): {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,21 @@
 # test/conftest.py
+import os
+import tempfile
+
+# Конфиг требует токен; тестам нужна отдельная БД, а не data/database/finance.db
+os.environ.setdefault("BOT_TOKEN", "123456:test-token")
+_TEST_DATA_DIR = tempfile.mkdtemp(prefix="finbot-test-")
+os.environ.setdefault("DB_PATH", os.path.join(_TEST_DATA_DIR, "finance.db"))
+os.environ.setdefault("EXPORT_CACHE_DIR", os.path.join(_TEST_DATA_DIR, "exports"))
+os.environ.setdefault("LOG_DIR", os.path.join(_TEST_DATA_DIR, "logs"))
+
 import pytest
+import pytest_asyncio
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from bot.database.models import Base
+from bot.database.migrations import run_migrations
 
 
 # Используем отдельную тестовую БД в памяти
@@ -23,4 +36,20 @@ def session():
 
     # Закрываем сессию и удаляем таблицы
     session.close()
-    Base.metadata.drop_all(bind=engine)
\ No newline at end of file
+    Base.metadata.drop_all(bind=engine)
+
+@pytest_asyncio.fixture
+async def async_engine(tmp_path):
+    # Файловая БД: у aiosqlite каждое соединение к :memory: — отдельная база
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'finance.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(run_migrations)
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_session(async_engine):
+    session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as session:
+        yield session
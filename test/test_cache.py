@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.database.repository import UserRepository, user_cache
+from bot.utils.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expired():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" становится самым свежим
+    cache.set("c", 3)           # вытесняет "b"
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.stats() == {"size": 1, "hits": 2, "misses": 2}
+
+
+@pytest.mark.asyncio
+async def test_user_cache_is_populated_and_invalidated(async_session):
+    user_cache.clear()
+    repo = UserRepository(async_session)
+
+    user = await repo.get_or_create_user(telegram_id=42)
+    await async_session.commit()
+    cached = await repo.get_cached_user(42)
+    assert cached.id == user.id and cached.is_active
+
+    # Повторный вызов get_or_create_user находит пользователя и кэш уже заполнен
+    await repo.get_or_create_user(telegram_id=42)
+    hits = user_cache.hits
+    assert await repo.get_cached_user(42) == cached
+    assert user_cache.hits == hits + 1
+
+    await repo.update_user_status(user.id, False)
+    # До коммита другие сессии видят старую запись, эта — уже изменённую
+    assert user_cache.get(42).is_active
+    assert (await repo.get_cached_user(42)).is_active is False
+    await async_session.commit()
+    assert user_cache.get(42) is None
+    assert (await repo.get_cached_user(42)).is_active is False
+    assert user_cache.get(42).is_active is False
+
+
+@pytest.mark.asyncio
+async def test_status_change_evicts_entry_cached_during_transaction(async_engine, async_session):
+    user_cache.clear()
+    repo = UserRepository(async_session)
+    user = await repo.get_or_create_user(telegram_id=44)
+    await async_session.commit()
+
+    await repo.update_user_status(user.id, False)
+    # Чтение из другой сессии до коммита возвращает в кэш старую запись
+    async with AsyncSession(async_engine) as other:
+        assert (await UserRepository(other).get_cached_user(44)).is_active
+    assert user_cache.get(44).is_active
+
+    await async_session.commit()
+    assert user_cache.get(44) is None
+
+
+@pytest.mark.asyncio
+async def test_new_user_is_cached_only_after_commit(async_session):
+    user_cache.clear()
+    repo = UserRepository(async_session)
+
+    await repo.get_or_create_user(telegram_id=43)
+    assert (await repo.get_cached_user(43)) is not None
+    assert user_cache.get(43) is None  # транзакция ещё может откатиться
+    await async_session.rollback()
+    assert user_cache.get(43) is None
+    assert await repo.get_cached_user(43) is None
+
+    user = await repo.get_or_create_user(telegram_id=43)
+    await async_session.commit()
+    assert user_cache.get(43).id == user.id
@@ -0,0 +1,288 @@
+import os
+import subprocess
+import sys
+import datetime
+from datetime import date
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from aiogram.types import BufferedInputFile
+from openpyxl import load_workbook
+from openpyxl.packaging import core as openpyxl_core
+
+from bot.database.repository import UserRepository, TransactionRepository, DebtRepository
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database import session as db_session
+from bot.database.session import current_session, create_read_engine, read_session
+from bot.services import export_service
+from bot.services.export_cache import ExportCache
+from bot.services.export_pool import ExportPool
+from bot.services.export_service import ExportService
+from bot.services.xlsx_writer import SheetSpool, write_workbook
+
+
+@pytest.fixture
+def thread_export_pool(monkeypatch):
+    pool = ExportPool("thread", max_workers=1, concurrency=1)
+    monkeypatch.setattr(export_service, "export_pool", pool)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fresh_export_cache(monkeypatch, tmp_path):
+    cache = ExportCache(str(tmp_path / "exports"), max_bytes=10 * 1024 * 1024, max_entries=10)
+    monkeypatch.setattr(export_service, "export_cache", cache)
+    return cache
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def read_connections(async_engine, monkeypatch):
+    # Выборки экспорта идут через соединения только для чтения к той же тестовой БД
+    read_engine = create_read_engine(str(async_engine.url), pool_size=5)
+    monkeypatch.setattr(
+        db_session, "read_async_session",
+        async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+    )
+    yield read_engine
+    await read_engine.dispose()
+
+
+@pytest.fixture
+def uow(async_session):
+    # Сервисы берут сессию из контекста — как внутри апдейта
+    token = current_session.set(async_session)
+    yield async_session
+    current_session.reset(token)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["streaming", "pandas"])
+async def test_export_builds_workbook_off_loop(uow, thread_export_pool, monkeypatch, backend):
+    monkeypatch.setattr(export_service, "EXPORT_BACKEND", backend)
+    user = await UserRepository(uow).get_or_create_user(telegram_id=7)
+    trans_repo = TransactionRepository(uow)
+    await trans_repo.add_transaction(user.id, "income", 1000, "Зарплата")
+    await trans_repo.add_transaction(user.id, "expense", 300, None)
+    await DebtRepository(uow).add_debt(user.id, "Кредит", 5000, date(2030, 1, 1), "Кредит")
+    await uow.commit()  # листы читаются с других соединений
+
+    excel_file, filename, _ = await ExportService.export_transactions_to_excel(7, "month")
+
+    assert filename.endswith(".xlsx")
+    workbook = load_workbook(BytesIO(excel_file.getvalue()))
+    assert workbook.sheetnames == ["Транзакции", "Долги"]
+
+    rows = list(workbook["Транзакции"].iter_rows(values_only=True))
+    assert rows[0] == ("Дата", "Тип", "Сумма (руб.)", "Описание")
+    assert [r[1] for r in rows[1:3]] == ["Расход", "Доход"]  # новые сверху
+    assert rows[-1] == (None, "Баланс", 700, "руб.")
+
+    debts = list(workbook["Долги"].iter_rows(values_only=True))
+    assert debts[-2][3:6] == ("ИТОГО:", "Остаток по долгам:", 5000)
+    # Ширина колонки — по самому длинному значению (заголовок "Полная сумма (руб.)" + 2)
+    assert workbook["Долги"].column_dimensions["E"].width == len("Полная сумма (руб.)") + 2
+
+
+def test_sheet_spool_streams_rows_and_tracks_widths():
+    spool = SheetSpool("Лист", ["A", "B"])
+    try:
+        for i in range(1000):
+            spool.append((i, "x" * (i % 70)))
+        spool.close()
+
+        assert spool.row_count == 1000
+        assert spool.column_widths() == [5, 50]  # "999" + 2 и ограничение в 50
+        assert next(iter(spool.rows())) == (0, "")
+
+        workbook = load_workbook(BytesIO(write_workbook([spool])))
+        assert workbook["Лист"].max_row == 1001
+    finally:
+        spool.discard()
+
+
+@pytest.mark.asyncio
+async def test_export_without_data_returns_none(uow, thread_export_pool):
+    await UserRepository(uow).get_or_create_user(telegram_id=8)
+    assert await ExportService.export_transactions_to_excel(8, "day") is None
+    assert await ExportService.export_transactions_to_excel(999, "day") is None
+
+
+@pytest.mark.asyncio
+async def test_repeated_export_is_served_from_cache_until_data_changes(uow, thread_export_pool, fresh_export_cache):
+    user = await UserRepository(uow).get_or_create_user(telegram_id=9)
+    trans_repo = TransactionRepository(uow)
+    await trans_repo.add_transaction(user.id, "income", 100)
+    await uow.commit()
+
+    first, *_ = await ExportService.export_transactions_to_excel(9, "month")
+    second, *_ = await ExportService.export_transactions_to_excel(9, "month")
+    assert second.getvalue() == first.getvalue()
+    assert fresh_export_cache.stats()["hits"] == 1
+
+    # Новая операция увеличивает версию данных — файл собирается заново
+    version = await UserRepository(uow).get_data_version(user.id)
+    await trans_repo.add_transaction(user.id, "expense", 10)
+    assert await UserRepository(uow).get_data_version(user.id) == version + 1
+    await uow.commit()
+
+    third, *_ = await ExportService.export_transactions_to_excel(9, "month")
+    assert third.getvalue() != first.getvalue()
+    assert fresh_export_cache.stats()["entries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_export_is_not_cached_when_data_changes_during_reads(uow, thread_export_pool, fresh_export_cache, monkeypatch):
+    user = await UserRepository(uow).get_or_create_user(telegram_id=10)
+    trans_repo = TransactionRepository(uow)
+    await trans_repo.add_transaction(user.id, "income", 100)
+    await uow.commit()
+
+    spool_debts = ExportService._spool_debts
+
+    async def write_between_reads(session, user_id):
+        # Другой апдейт записывает операцию, пока собираются листы
+        await trans_repo.add_transaction(user.id, "expense", 10)
+        await uow.commit()
+        return await spool_debts(session, user_id)
+
+    monkeypatch.setattr(ExportService, "_spool_debts", staticmethod(write_between_reads))
+    result = await ExportService.export_transactions_to_excel(10, "month")
+    assert result is not None and result.key is None  # и по file_id такой файл не переотправляется
+    assert fresh_export_cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_read_session_is_read_only(uow):
+    await UserRepository(uow).get_or_create_user(telegram_id=11)
+    await uow.commit()
+
+    async with read_session() as session:
+        assert (await session.execute(text("SELECT count(*) FROM users"))).scalar() == 1
+        with pytest.raises(OperationalError):
+            await session.execute(text("DELETE FROM users"))
+
+
+@pytest.mark.asyncio
+async def test_data_version_follows_debt_payments(async_session):
+    user = await UserRepository(async_session).get_or_create_user(telegram_id=10)
+    user_repo = UserRepository(async_session)
+    debt = await DebtRepository(async_session).add_debt(user.id, "Долг", 100, date(2030, 1, 1), "Кредит")
+    version = await user_repo.get_data_version(user.id)
+
+    await DebtRepository(async_session).record_payment(debt.id, 10)
+
+    assert await user_repo.get_data_version(user.id) > version
+
+
+@pytest.mark.asyncio
+async def test_export_cache_evicts_by_size_and_restores_index(tmp_path):
+    directory = str(tmp_path / "exports")
+    cache = ExportCache(directory, max_bytes=25, max_entries=10)
+
+    await cache.put("a", b"x" * 10, "a.xlsx")
+    await cache.put("b", b"y" * 10, "b.xlsx")
+    assert await cache.get("a") == (b"x" * 10, "a.xlsx")  # "a" становится свежее "b"
+    await cache.put("c", b"z" * 10, "c.xlsx")             # превышен лимит — вытесняется "b"
+
+    assert await cache.get("b") is None
+    assert cache.stats()["bytes"] == 20
+
+    # После перезапуска индекс восстанавливается с диска
+    restored = ExportCache(directory, max_bytes=25, max_entries=10)
+    assert await restored.get("c") == (b"z" * 10, "c.xlsx")
+    assert restored.stats()["entries"] == 2
+
+
+class _FakeMessage:
+    """Минимальная замена Message: запоминает, что отправлялось."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def answer_document(self, document, caption=None):
+        self.sent.append(document)
+        file_id = document if isinstance(document, str) else f"file-{len(self.sent)}"
+        return SimpleNamespace(document=SimpleNamespace(file_id=file_id))
+
+
+@pytest.mark.asyncio
+async def test_export_cache_directory_is_per_process(tmp_path):
+    cache = ExportCache(str(tmp_path / "exports"), max_bytes=100, max_entries=10)
+    await cache.put("a", b"x" * 10, "a.xlsx")
+
+    cache.relocate(str(tmp_path / "exports" / "worker-1"))
+    assert await cache.get("a") is None
+    await cache.put("b", b"y" * 10, "b.xlsx")
+
+    cache.relocate(str(tmp_path / "exports"))
+    assert await cache.get("a") == (b"x" * 10, "a.xlsx")
+    assert await cache.get("b") is None
+
+    # Файл удалили снаружи — промах, а не ошибка
+    os.remove(tmp_path / "exports" / "a.xlsx")
+    assert await cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_same_export_is_resent_by_file_id(uow):
+    from bot.handlers.finance.reports import send_export_document
+
+    message = _FakeMessage()
+    await send_export_document(message, b"xlsx-bytes", "report.xlsx", "key-1")
+    await send_export_document(message, b"xlsx-bytes", "report.xlsx", "key-1")
+    await send_export_document(message, b"other-bytes", "report.xlsx", "key-2")
+    # Без ключа (листы из разных снимков) файл всегда загружается и не запоминается
+    await send_export_document(message, b"xlsx-bytes", "report.xlsx", None)
+    await send_export_document(message, b"xlsx-bytes", "report.xlsx", None)
+
+    assert isinstance(message.sent[0], BufferedInputFile)
+    assert message.sent[1] == "file-1"  # без повторной загрузки
+    assert all(isinstance(document, BufferedInputFile) for document in message.sent[2:])
+
+
+@pytest.mark.asyncio
+async def test_rebuilt_export_is_uploaded_once(uow, thread_export_pool, monkeypatch, tmp_path):
+    from bot.handlers.finance.reports import send_export_document
+
+    user = await UserRepository(uow).get_or_create_user(telegram_id=12)
+    await TransactionRepository(uow).add_transaction(user.id, "income", 100)
+    await uow.commit()
+
+    message = _FakeMessage()
+    contents = []
+    for attempt in range(2):
+        # Кэш экспорта пуст — книга собирается заново. openpyxl пишет в неё время сборки
+        # с точностью до секунды; сдвигаем его, чтобы сборки не совпали побайтно
+        class BuildTime(datetime.datetime):
+            @classmethod
+            def utcnow(cls):
+                return datetime.datetime(2030, 1, 1, 12, 0, attempt)
+
+        monkeypatch.setattr(openpyxl_core, "datetime", SimpleNamespace(datetime=BuildTime))
+        cache = ExportCache(str(tmp_path / f"exports-{attempt}"), max_bytes=10 * 1024 * 1024, max_entries=10)
+        monkeypatch.setattr(export_service, "export_cache", cache)
+        result = await ExportService.export_transactions_to_excel(12, "month")
+        contents.append(result.file.getvalue())
+        await send_export_document(message, result.file.getvalue(), result.filename, result.key)
+
+    assert contents[0] != contents[1]
+    assert isinstance(message.sent[0], BufferedInputFile)
+    assert message.sent[1] == "file-1"  # те же данные — загрузка одна
+
+
+def test_pool_workers_import_only_the_builders():
+    # Так дочерний процесс пула загружает функцию сборки: пакет не должен тянуть БД, логгер и кэш экспорта
+    code = (
+        "import sys, bot.services.xlsx_writer, bot.services.excel_builder; "
+        "print(' '.join(sorted(m for m in sys.modules if m.startswith('bot'))))"
+    )
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], cwd=project_root, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["bot", "bot.services", "bot.services.excel_builder", "bot.services.xlsx_writer"]
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database.fsm_storage import SQLiteStorage
+from bot.database.models import FsmState
+
+
+def _key(chat_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+@pytest.fixture
+def session_factory(async_engine):
+    return async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _rows(session_factory) -> int:
+    async with session_factory() as session:
+        return (await session.execute(select(func.count()).select_from(FsmState))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_state_is_cached_and_written_in_batches(session_factory):
+    storage = SQLiteStorage(session_factory, cache_size=1, flush_interval=60)
+    await storage.set_state(_key(1), "DebtStates:waiting_for_amount")
+    await storage.set_data(_key(1), {"due_date": date(2025, 1, 31), "remaining": Decimal("10.50")})
+    await storage.set_state(_key(2), "ReportStates:viewing_report")  # вытесняет чат 1 из кэша
+
+    assert await storage.get_state(_key(1)) == "DebtStates:waiting_for_amount"
+    assert await _rows(session_factory) == 0  # в БД ещё ничего — запись пачкой
+
+    await storage.close()
+    assert await _rows(session_factory) == 2
+
+    # После перезапуска состояние читается из БД
+    restarted = SQLiteStorage(session_factory)
+    assert await restarted.get_state(_key(1)) == "DebtStates:waiting_for_amount"
+    assert await restarted.get_data(_key(1)) == {"due_date": date(2025, 1, 31), "remaining": Decimal("10.50")}
+
+    # Очищенное состояние удаляется из БД
+    await restarted.set_state(_key(2), None)
+    await restarted.close()
+    assert await _rows(session_factory) == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_states_expire(session_factory):
+    now = [1000.0]
+    storage = SQLiteStorage(session_factory, ttl=60, flush_interval=60, clock=lambda: now[0])
+    await storage.set_state(_key(1), "IncomeStates:waiting_for_amount")
+    await storage.close()
+
+    now[0] += 61
+    assert await storage.get_state(_key(1)) is None
+    assert await SQLiteStorage(session_factory, ttl=60, clock=lambda: now[0]).get_state(_key(1)) is None
+    assert await storage.purge_expired() == 1
+
+
+@pytest.mark.asyncio
+async def test_evicted_state_is_visible_while_it_is_being_written(session_factory):
+    commit_allowed = asyncio.Event()
+    slow = False
+
+    def slow_factory():
+        session = session_factory()
+        commit = session.commit
+
+        async def slow_commit():
+            if slow:
+                await commit_allowed.wait()
+            await commit()
+
+        session.commit = slow_commit
+        return session
+
+    storage = SQLiteStorage(slow_factory, cache_size=1, flush_interval=60)
+    await storage.set_state(_key(1), "DebtStates:waiting_for_amount")
+    await storage.flush()
+
+    await storage.set_state(_key(1), "DebtStates:waiting_for_due_date")
+    await storage.set_state(_key(2), "ReportStates:viewing_report")  # вытесняет чат 1 из кэша
+    slow = True
+    flushing = asyncio.create_task(storage.flush())
+    await asyncio.sleep(0.05)  # запись начата, коммит ещё не прошёл
+
+    # В БД пока старое состояние — читать его нельзя
+    assert await storage.get_state(_key(1)) == "DebtStates:waiting_for_due_date"
+    await storage.set_data(_key(1), {"amount": Decimal("100")})
+
+    commit_allowed.set()
+    await flushing
+    await storage.close()
+
+    restarted = SQLiteStorage(session_factory)
+    assert await restarted.get_state(_key(1)) == "DebtStates:waiting_for_due_date"
+    assert await restarted.get_data(_key(1)) == {"amount": Decimal("100")}
@@ -0,0 +1,180 @@
+import asyncio
+import itertools
+
+import pytest
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import CallbackQuery, Message
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.middleware import ChatOrderIsolation, ThrottlingMiddleware
+from bot.config import THROTTLE_GLOBAL_RATE
+from bot.middleware.throttling_middleware import BUSY_TEXT, EXPENSIVE_TEXT, TOO_FAST_TEXT
+from bot.utils.updates import make_update
+
+
+@pytest.mark.asyncio
+async def test_updates_of_one_chat_run_in_order_and_chats_in_parallel():
+    ordering = ChatOrderIsolation()
+    events = []
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        events.append(("start", message.chat.id, message.text))
+        await asyncio.sleep(0.05 if message.text == "1" else 0.01)
+        events.append(("end", message.chat.id, message.text))
+
+    dp = Dispatcher(events_isolation=ordering)
+    dp.include_router(router)
+    bot = Bot("123456:test-token")
+
+    updates = [make_update(1, 1, "1"), make_update(2, 1, "2"), make_update(3, 2, "3"), make_update(4, 1, "4")]
+    try:
+        await asyncio.gather(*(dp.feed_raw_update(bot, update) for update in updates))
+    finally:
+        await bot.session.close()
+
+    chat_1 = [(kind, text) for kind, chat_id, text in events if chat_id == 1]
+    assert chat_1 == [("start", "1"), ("end", "1"), ("start", "2"), ("end", "2"), ("start", "4"), ("end", "4")]
+    # Чат 2 не ждёт долгого апдейта чата 1
+    assert events.index(("end", 2, "3")) < events.index(("end", 1, "1"))
+    # Замки простаивающих чатов не копятся
+    assert ordering.active_chats == 0
+
+
+@pytest.mark.asyncio
+async def test_fsm_state_is_read_inside_the_chat_queue():
+    ordering = ChatOrderIsolation()
+    reads = []
+
+    class Storage(MemoryStorage):
+        async def get_state(self, key):
+            # Чтение до замка чата вернуло бы состояние до предыдущего апдейта
+            reads.append(ordering._locks[key.chat_id].lock.locked())
+            await asyncio.sleep(0)
+            return await super().get_state(key)
+
+    seen = []
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message, state: FSMContext, raw_state):
+        seen.append(raw_state)
+        await asyncio.sleep(0.02)
+        await state.set_state(f"после {message.text}")
+
+    dp = Dispatcher(storage=Storage(), events_isolation=ordering)
+    dp.include_router(router)
+    bot = Bot("123456:test-token")
+    try:
+        await asyncio.gather(*(dp.feed_raw_update(bot, make_update(i, 1, str(i))) for i in range(1, 4)))
+    finally:
+        await bot.session.close()
+
+    assert all(reads)
+    assert seen == [None, "после 1", "после 2"]
+
+
+@pytest.mark.asyncio
+async def test_throttling_limits_chats_and_sheds_reports_under_load(monkeypatch):
+    replies = []
+
+    async def answer(self, text, **kwargs):
+        replies.append((self.chat.id, text))
+
+    monkeypatch.setattr(Message, "answer", answer)
+
+    class Limiter:
+        depth = 0
+
+    now = [0.0]
+    limiter = Limiter()
+    throttling = ThrottlingMiddleware(
+        limiter, chat_rate=1, chat_burst=3, global_rate=100, global_burst=100,
+        expensive_rate=0.1, expensive_burst=1, shed_depth=10, notice_interval=5, clock=lambda: now[0],
+    )
+    handled = []
+    router = Router()
+
+    @router.message(F.text == "📤 Экспорт в Excel", flags={"throttling": "expensive"})
+    async def export(message: Message):
+        handled.append((message.chat.id, "export"))
+
+    @router.message(F.text == "📅 Месяц", flags={"throttling": "low"})
+    async def report(message: Message):
+        handled.append((message.chat.id, "report"))
+
+    @router.message()
+    async def other(message: Message):
+        handled.append((message.chat.id, "other"))
+
+    dp = Dispatcher()
+    dp.message.middleware(throttling)
+    dp.include_router(router)
+    bot = Bot("123456:test-token")
+
+    update_ids = itertools.count(1)
+
+    async def send(chat_id, text):
+        await dp.feed_raw_update(bot, make_update(next(update_ids), chat_id, text))
+
+    try:
+        # Шквал из одного чата: проходит только запас ведра, предупреждение — одно
+        for _ in range(5):
+            await send(1, "привет")
+        assert handled == [(1, "other")] * 3
+        assert replies == [(1, TOO_FAST_TEXT)]
+
+        # Другой чат не страдает; второй экспорт подряд — только через 10 секунд
+        await send(2, "📤 Экспорт в Excel")
+        await send(2, "📤 Экспорт в Excel")
+        assert handled[-1] == (2, "export") and handled.count((2, "export")) == 1
+        assert replies[-1] == (2, EXPENSIVE_TEXT.format(seconds=10))
+
+        # Длинная очередь: отчёты откладываются, обычные апдейты проходят
+        now[0] += 60
+        limiter.depth = 10
+        await send(3, "📅 Месяц")
+        await send(3, "привет")
+        assert replies[-1] == (3, BUSY_TEXT)
+        assert handled[-1] == (3, "other") and (3, "report") not in handled
+        assert throttling.shed == 1
+    finally:
+        await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_dropped_callback_is_always_answered(monkeypatch):
+    answers = []
+
+    async def answer(self, text=None, **kwargs):
+        answers.append(text)
+
+    monkeypatch.setattr(CallbackQuery, "answer", answer)
+    throttling = ThrottlingMiddleware(chat_rate=0.001, chat_burst=1, notice_interval=60, workers=4)
+    assert throttling._global.rate == THROTTLE_GLOBAL_RATE / 4  # общий лимит делится между процессами
+
+    router = Router()
+
+    @router.callback_query()
+    async def handle(callback: CallbackQuery):
+        answers.append("handled")
+
+    dp = Dispatcher()
+    dp.callback_query.middleware(throttling)
+    dp.include_router(router)
+    bot = Bot("123456:test-token")
+    try:
+        for update_id in range(3):
+            await dp.feed_raw_update(bot, {"update_id": update_id, "callback_query": {
+                "id": str(update_id), "chat_instance": "x", "data": "pay",
+                "from": {"id": 5, "is_bot": False, "first_name": "User"},
+                "message": {"message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"}},
+            }})
+    finally:
+        await bot.session.close()
+
+    # Предупреждение — один раз, но индикатор загрузки снимается на каждом нажатии
+    assert answers == ["handled", TOO_FAST_TEXT, None]
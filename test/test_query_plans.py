@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import event
+
+from bot.database.repository import (
+    TransactionRepository,
+    BillRepository,
+    DebtRepository,
+    DebtPaymentRepository,
+    PaymentScheduleRepository,
+)
+
+
+async def _query_plans(async_session, call):
+    """Выполняет call и возвращает планы (EXPLAIN QUERY PLAN) всех его SELECT-запросов."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    sync_engine = async_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", capture)
+    try:
+        await call()
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", capture)
+
+    plans = []
+    conn = await async_session.connection()
+    for statement, parameters in captured:
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        plans.append(" | ".join(row[-1] for row in result.fetchall()))
+    return plans
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "repo_class, method, args, index_name",
+    [
+        (TransactionRepository, "get_transactions_by_user_and_period", (1, "month"), "ix_transactions_user_date_type"),
+        (TransactionRepository, "get_period_totals", (1, "range:2025-01-05:2025-02-10"), "ix_transactions_user_date_type"),
+        (BillRepository, "get_active_bills_by_user", (1,), "ix_bills_user_paid_due"),
+        (DebtRepository, "get_active_debts_by_user", (1,), "ix_debts_user_active_due"),
+        (DebtPaymentRepository, "get_payments_by_debt", (1,), "ix_debt_payments_debt_paid_at"),
+        (PaymentScheduleRepository, "get_unpaid_schedules_by_debt", (1,), "ix_payment_schedules_debt_paid_due"),
+    ],
+)
+async def test_hot_queries_use_indexes(async_session, repo_class, method, args, index_name):
+    repo = repo_class(async_session)
+    plans = await _query_plans(async_session, lambda: getattr(repo, method)(*args))
+
+    assert plans, f"{method} не выполнил ни одного SELECT"
+    for plan in plans:
+        assert index_name in plan, plan
+        assert "SCAN" not in plan.replace(f"INDEX {index_name}", ""), plan
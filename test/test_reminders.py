@@ -0,0 +1,177 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramForbiddenError
+from aiogram.methods import SendMessage
+
+from sqlalchemy import select
+
+from bot.database.models import ReminderLog, PaymentSchedule
+from bot.database.repository import UserRepository, BillRepository, DebtRepository
+from bot.database.repository import ReminderRepository, ReminderLogRepository
+from bot.database.session import current_session
+from bot.scheduler import jobs, digest
+from bot.scheduler.dispatcher import ReminderDispatcher, OutgoingMessage
+from bot.utils.rate_limit import TokenBucket
+
+
+class FakeBot:
+    """Бот, который по очереди выдаёт заранее заданные ошибки для чата."""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        errors = self.errors.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+def _error(cls, **kwargs):
+    return cls(method=SendMessage(chat_id=1, text="x"), message="error", **kwargs)
+
+
+def test_token_bucket_refills_and_pauses():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.delay() == pytest.approx(0.5)
+
+    now[0] = 0.5
+    assert bucket.try_acquire()
+
+    bucket.pause(3)
+    now[0] = 3.0
+    assert not bucket.try_acquire()
+    now[0] = 4.0  # пауза до 3.5, за 0.5 с набежал один токен
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_retries_and_counts_outcomes():
+    bot = FakeBot({
+        1: [_error(TelegramRetryAfter, retry_after=0)],
+        2: [_error(TelegramNetworkError), _error(TelegramNetworkError)],
+        3: [_error(TelegramForbiddenError)],
+        4: [_error(TelegramNetworkError)] * 5,
+        6: [_error(TelegramRetryAfter, retry_after=0)] * 5,
+    })
+    dispatcher = ReminderDispatcher(bot, rate=1000, burst=10, concurrency=3, max_retries=2, retry_delay=0, max_throttles=3)
+
+    stats = await dispatcher.send_all([OutgoingMessage(chat_id, "text", key=chat_id) for chat_id in (1, 2, 3, 4, 5, 6)])
+
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [1, 2, 5]
+    assert sorted(stats.delivered) == [1, 2, 5]
+    # Чат 6: Telegram ограничивает каждый раз — после трёх повторов сообщение считается неотправленным
+    assert (stats.sent, stats.failed, stats.throttled, stats.retried) == (3, 3, 5, 4)
+
+
+@pytest.mark.asyncio
+async def test_daily_digest_groups_reminders_per_user(async_session):
+    token = current_session.set(async_session)
+    try:
+        today = datetime.now(jobs.MSK).date()
+        tomorrow = today + timedelta(days=1)
+        user = await UserRepository(async_session).get_or_create_user(telegram_id=555)
+        other = await UserRepository(async_session).get_or_create_user(telegram_id=777)
+        bill_repo = BillRepository(async_session)
+        await bill_repo.add_bill(user.id, 555, "Интернет", 700, tomorrow)
+        await bill_repo.add_bill(user.id, 555, "Телефон", 300, tomorrow)
+        await bill_repo.add_bill(user.id, 555, "Аренда", 30000, today + timedelta(days=10))  # вне порогов
+        await bill_repo.add_bill(other.id, 777, "Свет", 1200, tomorrow)
+        debt = await DebtRepository(async_session).add_debt(user.id, "Кредит", 5000, today - timedelta(days=2), "Кредит")
+        async_session.add(PaymentSchedule(debt_id=debt.id, amount=1000, due_date=tomorrow))
+        await async_session.flush()
+
+        bot = FakeBot()
+        stats = await jobs.send_daily_digest(bot, ReminderDispatcher(bot, rate=1000, burst=10))
+        # Повторный запуск (перезапуск бота, догоняющая рассылка) — журнал не даёт отправить ещё раз
+        repeat = await jobs.send_daily_digest(bot, ReminderDispatcher(bot, rate=1000, burst=10))
+        logged = (await async_session.execute(select(ReminderLog.item_type, ReminderLog.kind))).all()
+    finally:
+        current_session.reset(token)
+
+    assert (stats.sent, repeat.sent) == (2, 0)
+    texts = dict(bot.sent)
+    assert set(texts) == {555, 777}
+    assert "Интернет" in texts[555] and "Телефон" in texts[555] and "Аренда" not in texts[555]
+    assert "Кредит" in texts[555] and "Просроченные долги" in texts[555]
+    assert "по графику" in texts[555] and "по графику" not in texts[777]
+    assert "Свет" in texts[777]
+    assert sorted(logged) == [
+        ("bill", "d1"), ("bill", "d1"), ("bill", "d1"),
+        ("debt", "overdue"), ("schedule", "d1"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_long_digest_is_split_and_only_shown_items_are_logged(async_session, monkeypatch):
+    token = current_session.set(async_session)
+    try:
+        tomorrow = datetime.now(jobs.MSK).date() + timedelta(days=1)
+        user = await UserRepository(async_session).get_or_create_user(telegram_id=555)
+        bill_repo = BillRepository(async_session)
+        for i in range(80):
+            await bill_repo.add_bill(user.id, 555, f"Счёт {i:02d} " + "очень длинное описание " * 10, 100 + i, tomorrow)
+
+        async def logged():
+            return (await async_session.execute(select(ReminderLog.item_id))).scalars().all()
+
+        # Не влезло даже в разрешённое число сообщений — остаток не отмечается отправленным
+        monkeypatch.setattr(digest, "MAX_MESSAGES_PER_USER", 1)
+        bot = FakeBot()
+        await jobs.send_daily_digest(bot, ReminderDispatcher(bot, rate=1000, burst=10))
+        first = await logged()
+        assert len(bot.sent) == 1 and 0 < len(first) < 80
+
+        monkeypatch.undo()
+        sent_before = bot.sent
+        bot = FakeBot()
+        await jobs.send_daily_digest(bot, ReminderDispatcher(bot, rate=1000, burst=10))
+        assert len(bot.sent) > 1
+        assert len(await logged()) == 80
+    finally:
+        current_session.reset(token)
+
+    assert all(len(text) <= digest.MAX_MESSAGE_LENGTH for _, text in bot.sent)
+    shown = "".join(text for _, text in sent_before + bot.sent)
+    assert all(f"Счёт {i:02d}" in shown for i in range(80))
+
+
+@pytest.mark.asyncio
+async def test_each_reminder_offset_is_sent_once(async_session):
+    user = await UserRepository(async_session).get_or_create_user(telegram_id=555)
+    due = date(2025, 3, 20)
+    bill = await BillRepository(async_session).add_bill(user.id, 555, "Интернет", 700, due)
+    debt = await DebtRepository(async_session).add_debt(user.id, "Кредит", 5000, due, "Кредит")
+    async_session.add(PaymentSchedule(debt_id=debt.id, amount=1000, due_date=due))
+    await async_session.flush()
+    reminder_repo = ReminderRepository(async_session)
+    log_repo = ReminderLogRepository(async_session)
+
+    async def pending(today):
+        rows = await reminder_repo.get_digest_rows(today)
+        await log_repo.add_many([
+            {"item_type": r.item_type, "item_id": r.item_id, "kind": r.kind, "reminder_date": r.reminder_date}
+            for r in rows
+        ])
+        return sorted((r.item_type, r.kind) for r in rows)
+
+    assert await pending(due - timedelta(days=8)) == []
+    assert await pending(due - timedelta(days=6)) == [("bill", "d7"), ("schedule", "d7")]  # день порога пропущен
+    assert await pending(due - timedelta(days=5)) == []
+    assert await pending(due - timedelta(days=3)) == [("bill", "d3"), ("schedule", "d3")]
+    assert await pending(due) == [("bill", "d0"), ("schedule", "d0")]  # d1 пропущен — ближе уже d0
+    overdue = [("bill", "overdue"), ("debt", "overdue"), ("schedule", "overdue")]
+    assert await pending(due + timedelta(days=2)) == overdue
+    assert await pending(due + timedelta(days=2)) == []  # в тот же день — не повторяется
+    assert await pending(due + timedelta(days=3)) == overdue  # на следующий день — снова
+    assert await pending(due + timedelta(days=31)) == []  # дольше REMINDER_OVERDUE_DAYS не напоминаем
+
+    await BillRepository(async_session).pay_bill(bill.id)
+    assert await reminder_repo.get_digest_rows(due) == []  # оплаченные не напоминаются
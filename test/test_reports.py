@@ -0,0 +1,130 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select, delete
+
+from bot.database.models import MonthlyRollup
+from bot.database.repository import UserRepository, TransactionRepository, DebtRepository, MonthlyRollupRepository
+from bot.utils.parsers import parse_date_range
+from bot.utils.periods import period_bounds, previous_bounds, period_title, make_range_period
+
+
+@pytest.mark.asyncio
+async def test_period_totals_are_aggregated_in_sql(async_session):
+    user = await UserRepository(async_session).get_or_create_user(telegram_id=1)
+    other = await UserRepository(async_session).get_or_create_user(telegram_id=2)
+    trans_repo = TransactionRepository(async_session)
+
+    await trans_repo.add_transaction(user.id, "income", 1000.50)
+    await trans_repo.add_transaction(user.id, "income", 500)
+    await trans_repo.add_transaction(user.id, "expense", 250.25)
+    await trans_repo.add_transaction(other.id, "expense", 999)
+
+    totals = await trans_repo.get_period_totals(user.id, "day")
+    assert totals == {"income": 1500.50, "expense": 250.25, "count": 3}
+
+    assert await trans_repo.get_period_totals(12345, "year") == {"income": 0.0, "expense": 0.0, "count": 0}
+
+
+@pytest.mark.asyncio
+async def test_debt_statistics_are_grouped_in_sql(async_session):
+    user = await UserRepository(async_session).get_or_create_user(telegram_id=1)
+    debt_repo = DebtRepository(async_session)
+    today = date.today()
+
+    credit = await debt_repo.add_debt(user.id, "Кредит", 1000, today + timedelta(days=30), "Кредит")
+    await debt_repo.add_debt(user.id, "Просрочка", 300, today - timedelta(days=1), "Кредит")
+    await debt_repo.add_debt(user.id, "Другу", 200, today + timedelta(days=3), "Другое", note="Вася")
+    await debt_repo.add_debt(user.id, "Прочее", 100, today + timedelta(days=5), "Другое")
+    await debt_repo.record_payment(credit.id, 400)
+
+    stats = await debt_repo.get_debt_statistics(user.id)
+
+    assert stats["total_debts"] == 4
+    assert stats["total_amount"] == 1600
+    assert stats["remaining"] == 1200
+    assert stats["paid"] == 400
+    assert stats["overdue_count"] == 1
+    assert stats["overdue_amount"] == 300
+    assert stats["by_category"] == {
+        "Кредит": {"count": 2, "total": 1300, "paid": 400},
+        "Другое (Вася)": {"count": 1, "total": 200, "paid": 0},
+        "Другое": {"count": 1, "total": 100, "paid": 0},
+    }
+    assert [d.description for d in stats["nearest"]] == ["Просрочка", "Другу", "Прочее", "Кредит"]
+
+
+@pytest.mark.asyncio
+async def test_monthly_rollups_follow_transactions_and_rebuild(async_session):
+    user = await UserRepository(async_session).get_or_create_user(telegram_id=1)
+    trans_repo = TransactionRepository(async_session)
+    rollup_repo = MonthlyRollupRepository(async_session)
+
+    await trans_repo.add_transaction(user.id, "income", 100)
+    await trans_repo.add_transaction(user.id, "income", 50.5)
+    await trans_repo.add_transaction(user.id, "expense", 20)
+
+    rows = (await async_session.execute(
+        select(MonthlyRollup.type, MonthlyRollup.total, MonthlyRollup.count).order_by(MonthlyRollup.type)
+    )).all()
+    assert [(t, float(total), count) for t, total, count in rows] == [("expense", 20, 1), ("income", 150.5, 2)]
+
+    # Месяц и год читаются из итогов и совпадают с подсчётом по транзакциям
+    expected = {"income": 150.5, "expense": 20.0, "count": 3}
+    assert await trans_repo.get_period_totals(user.id, "month") == expected
+    assert await trans_repo.get_period_totals(user.id, "year") == expected
+
+    await async_session.execute(delete(MonthlyRollup))
+    await rollup_repo.rebuild()
+    assert await trans_repo.get_period_totals(user.id, "year") == expected
+
+
+def test_period_bounds_for_custom_ranges():
+    today = date(2025, 5, 14)
+
+    def days(period):
+        start, end = period_bounds(period, today)
+        return start.date(), end.date()
+
+    assert days("prev_month") == (date(2025, 4, 1), date(2025, 5, 1))
+    assert days("quarter") == (date(2025, 4, 1), date(2025, 7, 1))
+    assert days("prev_quarter") == (date(2025, 1, 1), date(2025, 4, 1))
+    assert days("range:2025-01-05:2025-02-10") == (date(2025, 1, 5), date(2025, 2, 11))  # конец включительно
+    with pytest.raises(ValueError):
+        period_bounds("range:2025-02-10:2025-01-05", today)
+
+    # Предыдущий период: те же месяцы раньше либо столько же дней
+    prev_start, prev_end = previous_bounds(*period_bounds("quarter", today))
+    assert (prev_start.date(), prev_end.date()) == (date(2025, 1, 1), date(2025, 4, 1))
+    prev_start, prev_end = previous_bounds(*period_bounds("range:2025-01-05:2025-01-14", today))
+    assert (prev_start.date(), prev_end.date()) == (date(2024, 12, 26), date(2025, 1, 5))
+
+    assert period_title("prev_month", today) == "апрель 2025"
+    assert period_title("quarter", today) == "2 квартал 2025"
+    assert period_title("range:2025-01-05:2025-02-10", today) == "05.01.2025 – 10.02.2025"
+
+
+def test_parse_date_range():
+    assert parse_date_range("01.01.2025 - 31.03.2025") == (date(2025, 1, 1), date(2025, 3, 31))
+    assert parse_date_range("01.01.2025–31.03.2025") == (date(2025, 1, 1), date(2025, 3, 31))
+    assert parse_date_range("15.02.2025") == (date(2025, 2, 15), date(2025, 2, 15))
+    assert parse_date_range("31.03.2025 - 01.01.2025") is None
+    assert parse_date_range("март") is None
+
+
+@pytest.mark.asyncio
+async def test_range_totals_and_previous_period(async_session):
+    user = await UserRepository(async_session).get_or_create_user(telegram_id=1)
+    trans_repo = TransactionRepository(async_session)
+    tx = await trans_repo.add_transaction(user.id, "income", 100)
+    old = await trans_repo.add_transaction(user.id, "expense", 40)
+    old.date = tx.date - timedelta(days=40)
+    await async_session.flush()
+
+    today = tx.date.date()
+    period = make_range_period(today - timedelta(days=29), today)
+    start, end = period_bounds(period, today)
+    assert await trans_repo.get_range_totals(user.id, start, end) == {"income": 100.0, "expense": 0.0, "count": 1}
+    assert await trans_repo.get_range_totals(user.id, *previous_bounds(start, end)) == {
+        "income": 0.0, "expense": 40.0, "count": 1
+    }
@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.database.models import User
+from bot.database.repository import UserRepository
+from bot.database.session import session_scope, savepoint
+from bot.middleware import DbSessionMiddleware, CommitBeforeRequestMiddleware
+
+
+@pytest.mark.asyncio
+async def test_one_session_and_one_commit_per_update(async_engine):
+    session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    middleware = DbSessionMiddleware(session_factory)
+    commits = []
+    event.listen(async_engine.sync_engine, "commit", lambda conn: commits.append(conn))
+
+    async def handler(event_, data):
+        # Сервисы внутри апдейта получают ту же сессию, что и хендлер
+        async with session_scope() as service_session:
+            assert service_session is data["session"]
+            await UserRepository(service_session).get_or_create_user(telegram_id=1)
+        async with session_scope() as service_session:
+            await UserRepository(service_session).get_or_create_user(telegram_id=2)
+        return "ok"
+
+    assert await middleware(handler, object(), {}) == "ok"
+    assert len(commits) == 1
+
+    async with session_factory() as session:
+        result = await session.execute(select(User.telegram_id).order_by(User.telegram_id))
+        assert result.scalars().all() == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_reply_commits_first_and_failed_operation_keeps_earlier_work(async_engine):
+    session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def telegram_ids():
+        async with session_factory() as session:
+            result = await session.execute(select(User.telegram_id).order_by(User.telegram_id))
+            return result.scalars().all()
+
+    async def make_request(bot, method):
+        # Ответ уходит уже после коммита — блокировка записи не держится во время HTTP
+        assert await telegram_ids() == [1]
+        return "sent"
+
+    async def handler(event_, data):
+        session = data["session"]
+        await UserRepository(session).get_or_create_user(telegram_id=1)
+        assert await CommitBeforeRequestMiddleware()(make_request, None, None) == "sent"
+
+        await UserRepository(session).get_or_create_user(telegram_id=2)
+        with pytest.raises(RuntimeError):
+            async with savepoint(session):
+                await UserRepository(session).get_or_create_user(telegram_id=3)
+                raise RuntimeError("ошибка в сервисе")
+        return "ok"
+
+    assert await DbSessionMiddleware(session_factory)(handler, object(), {}) == "ok"
+    assert await telegram_ids() == [1, 2]
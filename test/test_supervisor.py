@@ -0,0 +1,151 @@
+import asyncio
+import queue
+
+import pytest
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Message
+
+from bot.middleware import ConcurrencyLimitMiddleware, ThrottlingMiddleware
+from bot.middleware.throttling_middleware import BUSY_TEXT
+from bot.supervisor import Supervisor, chat_id_of, consume_updates, queue_size, worker_index
+from bot.utils.updates import make_update
+
+
+def test_updates_are_partitioned_by_chat():
+    callback = {"update_id": 2, "callback_query": {
+        "id": "1", "from": {"id": 7}, "chat_instance": "x", "message": {"message_id": 1, "chat": {"id": -100}},
+    }}
+    assert chat_id_of(make_update(1, 42, "привет")) == 42
+    assert chat_id_of(callback) == -100
+    assert chat_id_of({"update_id": 3, "inline_query": {"id": "1", "from": {"id": 9}}}) == 9
+    assert chat_id_of({"update_id": 4}) == 0
+
+    assert {worker_index(make_update(i, 5, "привет"), 3) for i in range(10)} == {5 % 3}
+
+
+@pytest.mark.asyncio
+async def test_dispatch_routes_each_chat_to_its_queue():
+    supervisor = Supervisor(workers=2, queue_size=10)
+    for update_id, chat_id in enumerate((1, 2, 3, 4)):
+        await supervisor.dispatch(make_update(update_id, chat_id, "привет"))
+
+    received = [
+        [supervisor.queues[index].get(timeout=1)["message"]["chat"]["id"] for _ in range(2)]
+        for index in range(2)
+    ]
+    assert received == [[2, 4], [1, 3]]
+
+
+@pytest.mark.asyncio
+async def test_worker_finishes_started_updates_before_exit():
+    handled = []
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        handled.append(message.text)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot("123456:test-token")
+
+    updates = queue.Queue()
+    for update_id in range(3):
+        updates.put(make_update(update_id, 1, f"апдейт {update_id}"))
+    updates.put(None)
+    updates.put(make_update(99, 1, "после остановки"))
+
+    try:
+        await consume_updates(dp, bot, updates, shutdown_timeout=5)
+    finally:
+        await bot.session.close()
+
+    assert sorted(handled) == ["апдейт 0", "апдейт 1", "апдейт 2"]
+
+
+@pytest.mark.asyncio
+async def test_worker_takes_no_more_updates_than_it_can_handle():
+    release = asyncio.Event()
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        await release.wait()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot("123456:test-token")
+
+    updates = queue.Queue()
+    for update_id in range(5):
+        updates.put(make_update(update_id, update_id, "привет"))
+    updates.put(None)
+
+    consumer = asyncio.create_task(consume_updates(dp, bot, updates, shutdown_timeout=5, max_in_flight=2))
+    try:
+        await asyncio.sleep(0.2)
+        # Двое в работе — остальные ждут в очереди, а не в памяти обработчика
+        assert updates.qsize() == 4
+        release.set()
+        await asyncio.wait_for(consumer, 5)
+    finally:
+        await bot.session.close()
+    assert updates.empty()
+
+
+@pytest.mark.asyncio
+async def test_reports_are_shed_when_worker_queue_is_long(monkeypatch):
+    replies = []
+
+    async def answer(self, text, **kwargs):
+        replies.append((self.chat.id, text))
+
+    monkeypatch.setattr(Message, "answer", answer)
+
+    release = asyncio.Event()
+    handled = []
+    router = Router()
+
+    @router.message(F.text == "📅 Месяц", flags={"throttling": "low"})
+    async def report(message: Message):
+        handled.append((message.chat.id, "report"))
+
+    @router.message(F.text == "ждать")
+    async def slow(message: Message):
+        await release.wait()
+
+    @router.message()
+    async def other(message: Message):
+        handled.append((message.chat.id, "other"))
+
+    updates = queue.Queue()
+    # Процесс берёт не больше апдейтов, чем пропускает семафор: тот никогда не ждёт,
+    # и длину очереди видно только по очереди процесса
+    limiter = ConcurrencyLimitMiddleware(2, backlog=lambda: queue_size(updates))
+    throttling = ThrottlingMiddleware(limiter, chat_rate=100, chat_burst=100, shed_depth=3)
+    dp = Dispatcher()
+    dp.update.outer_middleware(limiter)
+    dp.message.middleware(throttling)
+    dp.include_router(router)
+    bot = Bot("123456:test-token")
+
+    updates.put(make_update(1, 1, "ждать"))
+    updates.put(make_update(2, 2, "ждать"))
+    updates.put(make_update(3, 3, "📅 Месяц"))  # за ним в очереди ещё 6 апдейтов
+    for update_id in range(4, 9):
+        updates.put(make_update(update_id, update_id, "привет"))
+    updates.put(make_update(9, 9, "📅 Месяц"))  # очередь к этому времени разобрана
+    updates.put(None)
+
+    consumer = asyncio.create_task(consume_updates(dp, bot, updates, shutdown_timeout=5, max_in_flight=2))
+    try:
+        await asyncio.sleep(0.2)
+        assert limiter.waiting == 0 and limiter.depth == 8
+        release.set()
+        await asyncio.wait_for(consumer, 5)
+    finally:
+        await bot.session.close()
+
+    assert replies == [(3, BUSY_TEXT)]
+    assert (3, "report") not in handled and (9, "report") in handled
+    assert throttling.shed == 1
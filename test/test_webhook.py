@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp import web
+
+from bot.middleware import ConcurrencyLimitMiddleware
+from bot.webhook import create_webhook_app
+from bot.webhook_harness import post_updates
+from bot.utils.updates import make_update
+
+SECRET = "test-secret"
+
+
+@pytest.mark.asyncio
+async def test_webhook_checks_secret_and_bounds_concurrency():
+    handled = []
+    running = []
+    limiter = ConcurrencyLimitMiddleware(2)
+
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        running.append(limiter.active)
+        await asyncio.sleep(0.05)
+        handled.append(message.chat.id)
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(limiter)
+    dp.include_router(router)
+    bot = Bot("123456:test-token")
+
+    runner = web.AppRunner(create_webhook_app(dp, bot, SECRET, path="/webhook"))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    url = f"http://{host}:{port}/webhook"
+    try:
+        rejected = await post_updates(url, "wrong", [make_update(1, 1, "привет")])
+        assert rejected["statuses"] == {401: 1}
+
+        accepted = await post_updates(url, SECRET, [make_update(i, i % 3, "привет") for i in range(2, 12)], 10)
+        assert accepted["statuses"] == {200: 10}
+
+        for _ in range(100):
+            if len(handled) == 10:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
+
+    assert len(handled) == 10
+    assert max(running) <= 2